@@ -0,0 +1,168 @@
+"""
+Analysis Cache for ShortDrama Worker
+
+Smart-crop analysis is the most expensive CPU step after encoding, and
+requeued or reprocessed jobs run it again on identical bytes. Results are
+cached under a key derived from the source:
+
+    content fingerprint of the source + start/duration + analysis parameters
+
+The fingerprint samples the file rather than hashing all of it (see
+content_fingerprint), so the cache assumes that two different sources never
+share their size and every sampled block.
+
+Entries are .npz files (arrays plus a JSON metadata string) in a local
+directory bounded in size with least-recently-used eviction. Optionally the
+cache is backed by a bucket, so a job retried on another worker also hits.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+FINGERPRINT_BLOCKS = 64
+FINGERPRINT_BLOCK_BYTES = 256 * 1024
+
+_fingerprints: Dict[Tuple[str, int, int], str] = {}
+_fingerprints_lock = threading.Lock()
+
+
+def content_fingerprint(path: str) -> Optional[str]:
+    """
+    SHA-256 over the file size and 64 evenly spaced 256 KB blocks (the whole
+    file when smaller), so multi-GB sources are fingerprinted in a few reads.
+    Larger files are sampled, not hashed in full: bytes between the blocks
+    are not covered, and two files of the same size that differ only there
+    get the same fingerprint. Sources are whole uploaded videos, where any
+    re-encode or edit changes the size or the sampled blocks, so this is
+    taken as an identity. Memoized per (path, size, mtime). None for URLs
+    and missing files.
+    """
+    if path.startswith(("http://", "https://")):
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _fingerprints_lock:
+        if memo_key in _fingerprints:
+            return _fingerprints[memo_key]
+
+    digest = hashlib.sha256(str(st.st_size).encode())
+    with open(path, "rb") as f:
+        if st.st_size <= FINGERPRINT_BLOCKS * FINGERPRINT_BLOCK_BYTES:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        else:
+            step = (st.st_size - FINGERPRINT_BLOCK_BYTES) // (FINGERPRINT_BLOCKS - 1)
+            for i in range(FINGERPRINT_BLOCKS):
+                f.seek(i * step)
+                digest.update(f.read(FINGERPRINT_BLOCK_BYTES))
+    fingerprint = digest.hexdigest()
+
+    with _fingerprints_lock:
+        _fingerprints[memo_key] = fingerprint
+    return fingerprint
+
+
+def cache_key(*parts) -> str:
+    """Stable key from JSON-serializable parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Local disk cache of analysis results with LRU eviction, optionally
+    backed by a bucket (`s3` client + `bucket`, objects under `prefix`).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        s3=None,
+        bucket: Optional[str] = None,
+        prefix: str = "analysis-cache/",
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.s3 = s3 if bucket else None
+        self.bucket = bucket
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, np.ndarray], dict]]:
+        """(arrays, meta) for key, or None on a miss."""
+        path = self._path(key)
+        if not os.path.exists(path) and self.s3 is not None:
+            self._fetch_remote(key, path)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data["__meta__"]))
+                arrays = {name: data[name] for name in data.files if name != "__meta__"}
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return arrays, meta
+
+    def put(self, key: str, arrays: Dict[str, np.ndarray], meta: dict):
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp.npz"
+        try:
+            np.savez_compressed(tmp, __meta__=np.array(json.dumps(meta)), **arrays)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[AnalysisCache] Failed to store {key}: {e}", flush=True)
+            return
+        if self.s3 is not None:
+            try:
+                self.s3.upload_file(path, self.bucket, self.prefix + os.path.basename(path))
+            except Exception as e:
+                print(f"[AnalysisCache] Failed to upload {key}: {e}", flush=True)
+        self._evict()
+
+    def _fetch_remote(self, key: str, path: str):
+        tmp = f"{path}.{threading.get_ident()}.part"
+        try:
+            self.s3.download_file(self.bucket, self.prefix + os.path.basename(path), tmp)
+            os.replace(tmp, path)
+        except Exception:
+            # Miss (or bucket unavailable): analysis runs as usual
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Drop least recently used entries until the directory fits max_bytes."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".npz") or ".tmp" in name:
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    total -= size
+                except OSError:
+                    pass
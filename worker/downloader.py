@@ -0,0 +1,174 @@
+"""
+Ranged HTTP Downloader for ShortDrama Worker
+
+Downloads large source files from partner CDNs with:
+- several HTTP Range requests in flight at once (one per chunk)
+- large read buffers and connect/read timeouts
+- resume: finished chunks are recorded next to the partial file, so a
+  dropped connection or a retried job only fetches what is missing
+
+Servers that do not support ranges fall back to a single streamed GET.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS") or 8)
+DOWNLOAD_CHUNK_MB = int(os.environ.get("DOWNLOAD_CHUNK_MB") or 16)
+DOWNLOAD_BUFFER_BYTES = 1024 * 1024
+DOWNLOAD_TIMEOUT = (10, 60)  # (connect, read) seconds
+DOWNLOAD_RETRIES = 5
+
+
+def _probe(session: requests.Session, url: str) -> dict:
+    """Find size, range support and a validator (ETag / Last-Modified) for url."""
+    info = {"size": None, "ranges": False, "validator": None}
+    try:
+        # A 1-byte ranged GET is more reliable than HEAD on CDNs and presigned URLs
+        with session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+            r.raise_for_status()
+            info["validator"] = r.headers.get("ETag") or r.headers.get("Last-Modified")
+            content_range = r.headers.get("Content-Range", "")
+            if r.status_code == 206 and "/" in content_range:
+                total = content_range.rsplit("/", 1)[1]
+                if total.isdigit():
+                    info["size"] = int(total)
+                    info["ranges"] = True
+            elif r.headers.get("Content-Length", "").isdigit():
+                info["size"] = int(r.headers["Content-Length"])
+    except requests.RequestException as e:
+        print(f"[Downloader] Range probe failed ({e}), using a single stream", flush=True)
+    return info
+
+
+def _load_state(state_path: str, expected: dict) -> set:
+    """
+    Finished chunk indices from a previous attempt, if it was provably for the
+    same object: same size and chunk size, and the same validator, or the same
+    URL when the server sends no validator (size alone does not identify it).
+    """
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    identity = ("validator",) if expected.get("validator") else ("validator", "url")
+    for key in ("size", "chunk_size") + identity:
+        if state.get(key) != expected.get(key):
+            return set()
+    return set(state.get("done", []))
+
+
+def _save_state(state_path: str, state: dict):
+    tmp = state_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, state_path)
+
+
+def _download_single(session: requests.Session, url: str, dest_path: str):
+    part_path = dest_path + ".part"
+    with session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+        r.raise_for_status()
+        with open(part_path, "wb") as f:
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_BUFFER_BYTES):
+                f.write(chunk)
+    os.replace(part_path, dest_path)
+
+
+def download_ranged(
+    url: str,
+    dest_path: str,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+):
+    """
+    Download url to dest_path using concurrent Range requests, resuming a
+    previous partial download of the same object if one is present.
+    """
+    workers = workers or DOWNLOAD_WORKERS
+    chunk_size = chunk_size or DOWNLOAD_CHUNK_MB * 1024 * 1024
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    info = _probe(session, url)
+    size = info["size"]
+    if not info["ranges"] or not size:
+        print(f"[Downloader] Server does not support ranges, streaming {url}", flush=True)
+        _download_single(session, url, dest_path)
+        return
+
+    part_path = dest_path + ".part"
+    state_path = dest_path + ".part.json"
+    state = {"url": url, "size": size, "chunk_size": chunk_size, "validator": info["validator"]}
+
+    done = _load_state(state_path, state) if os.path.exists(part_path) else set()
+    if not done:
+        # Fresh download (a partial file of another object is discarded): preallocate
+        # the partial file so chunks can be written in place
+        try:
+            os.remove(state_path)
+        except OSError:
+            pass
+        with open(part_path, "wb") as f:
+            f.truncate(size)
+
+    chunks = [(i, start, min(start + chunk_size, size) - 1) for i, start in enumerate(range(0, size, chunk_size))]
+    todo = [c for c in chunks if c[0] not in done]
+    print(
+        f"[Downloader] {size} bytes in {len(chunks)} chunk(s), "
+        f"{len(chunks) - len(todo)} already done, {workers} connection(s)",
+        flush=True,
+    )
+
+    lock = threading.Lock()
+
+    def fetch(chunk):
+        idx, start, end = chunk
+        for attempt in range(1, DOWNLOAD_RETRIES + 1):
+            try:
+                headers = {"Range": f"bytes={start}-{end}"}
+                if info["validator"] and not info["validator"].startswith("W/"):
+                    # The object changed since the probe: the server answers 200, not 206
+                    headers["If-Range"] = info["validator"]
+                with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                    if r.status_code != 206:
+                        raise RuntimeError(f"expected 206 for range {start}-{end}, got {r.status_code}")
+                    written = 0
+                    with open(part_path, "r+b") as f:
+                        f.seek(start)
+                        for data in r.iter_content(chunk_size=DOWNLOAD_BUFFER_BYTES):
+                            f.write(data)
+                            written += len(data)
+                if written != end - start + 1:
+                    raise RuntimeError(f"short read for range {start}-{end}: {written} bytes")
+                with lock:
+                    done.add(idx)
+                    _save_state(state_path, dict(state, done=sorted(done)))
+                return
+            except Exception as e:
+                if attempt == DOWNLOAD_RETRIES:
+                    raise
+                print(f"[Downloader] Chunk {idx} attempt {attempt} failed ({e}), retrying", flush=True)
+                time.sleep(min(30, 2 ** attempt))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for _ in pool.map(fetch, todo):
+            pass
+
+    if os.path.getsize(part_path) != size or len(done) != len(chunks):
+        raise RuntimeError(f"download incomplete: {len(done)}/{len(chunks)} chunks")
+    os.replace(part_path, dest_path)
+    try:
+        os.remove(state_path)
+    except OSError:
+        pass
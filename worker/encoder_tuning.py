@@ -0,0 +1,255 @@
+"""
+Encoder Tuning for ShortDrama Worker
+
+The worker fleet mixes CPU generations, so one fixed libx264 preset either
+wastes quality on fast hosts or falls behind on slow ones. At startup the
+worker calibrates instead:
+
+1. probe the encoders ffmpeg offers (once per process),
+2. encode a short synthetic clip to 1080x1920 with each preset (fastest
+   first) at every thread count the worker's budgets hand to ffmpeg, running
+   as many encodes at once as the worker does with that thread count,
+3. keep, per thread count, the slowest preset whose slowest encode still
+   reaches ENCODER_TARGET_SPEED x real time with CALIBRATION_HEADROOM to spare
+   (the synthetic clip is easier than real footage, and the host also runs
+   analysis and uploads).
+
+The choice is cached on disk keyed by the host (CPU model and count, ffmpeg
+build, calibration settings), so restarts skip the benchmark.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+# libx264 preset: a fixed preset name, or "auto" to calibrate on this host
+ENCODER_PRESET = os.environ.get("ENCODER_PRESET", "auto").strip().lower()
+# Presets tried by the calibration, fastest first
+ENCODER_PRESETS = [
+    p.strip() for p in os.environ.get("ENCODER_PRESETS", "superfast,veryfast,faster,fast,medium").split(",") if p.strip()
+]
+# Minimum encode speed (seconds of video per second) a calibrated preset must reach
+ENCODER_TARGET_SPEED = float(os.environ.get("ENCODER_TARGET_SPEED") or 1.0)
+# Length of the synthetic calibration clip
+ENCODER_CALIBRATION_SEC = int(os.environ.get("ENCODER_CALIBRATION_SEC") or 3)
+ENCODER_CALIBRATION_FILE = os.environ.get("ENCODER_CALIBRATION_FILE") or os.path.join(
+    tempfile.gettempdir(), "shortdrama-encoder-calibration.json"
+)
+
+# Preset used until (or without) a calibration
+DEFAULT_PRESET = "veryfast"
+DEFAULT_CRF = 23
+# A preset is kept only if it measures this much faster than ENCODER_TARGET_SPEED
+CALIBRATION_HEADROOM = 1.25
+
+# Calibration source: landscape 1080p test pattern with a little grain, so
+# the encoder sees motion and texture like real footage after the vertical crop
+CALIBRATION_SOURCE = "testsrc2=size=1920x1080:rate=30"
+CALIBRATION_GRAIN = "noise=alls=8:allf=t"
+CALIBRATION_FILTER = "scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920"
+
+_encoders: Optional[Set[str]] = None
+_encoders_lock = threading.Lock()
+_presets: Dict[str, str] = {}  # thread count ("0" = ffmpeg default) -> preset
+
+
+def available_encoders(ffmpeg_path: str = "ffmpeg") -> Set[str]:
+    """Encoder names from `ffmpeg -encoders`, probed once per process."""
+    global _encoders
+    with _encoders_lock:
+        if _encoders is None:
+            names = set()
+            try:
+                out = subprocess.run([ffmpeg_path, "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+                for line in out.splitlines():
+                    parts = line.split()
+                    # " V....D libx264    libx264 H.264 / ..." (the legend above uses "=")
+                    if len(parts) >= 2 and len(parts[0]) == 6 and "=" not in line:
+                        names.add(parts[1])
+            except OSError:
+                pass
+            _encoders = names
+        return _encoders
+
+
+def _threads_key(threads: Optional[int]) -> str:
+    return str(threads or 0)
+
+
+def tuned_preset(threads: Optional[int] = None) -> str:
+    """libx264 preset for an encode with `threads` ffmpeg threads (None = ffmpeg default)."""
+    if ENCODER_PRESET != "auto":
+        return ENCODER_PRESET
+    preset = _presets.get(_threads_key(threads))
+    if preset is None and _presets:
+        # Not calibrated for this thread count: use the closest one that was
+        wanted = threads or os.cpu_count() or 1
+        closest = min(_presets, key=lambda k: abs((int(k) or os.cpu_count() or 1) - wanted))
+        preset = _presets[closest]
+    return preset or DEFAULT_PRESET
+
+
+def libx264_args(threads: Optional[int] = None) -> list:
+    return ["-preset", tuned_preset(threads), "-crf", str(DEFAULT_CRF)]
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def _ffmpeg_version(ffmpeg_path: str) -> str:
+    try:
+        out = subprocess.run([ffmpeg_path, "-hide_banner", "-version"], capture_output=True, text=True).stdout
+        return out.splitlines()[0] if out else ""
+    except OSError:
+        return ""
+
+
+def host_fingerprint(ffmpeg_path: str) -> dict:
+    """What a calibration depends on; a cached one is reused only if all of it matches."""
+    return {
+        "cpu": _cpu_model(),
+        "cores": os.cpu_count() or 1,
+        "ffmpeg": _ffmpeg_version(ffmpeg_path),
+        "presets": ENCODER_PRESETS,
+        "target_speed": ENCODER_TARGET_SPEED,
+        "headroom": CALIBRATION_HEADROOM,
+        "clip_sec": ENCODER_CALIBRATION_SEC,
+    }
+
+
+def _make_calibration_clip(ffmpeg_path: str, path: str):
+    # Near-lossless intra-heavy source so decoding it costs about what a real source does
+    subprocess.run(
+        [
+            ffmpeg_path, "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"{CALIBRATION_SOURCE}:duration={ENCODER_CALIBRATION_SEC}",
+            "-vf", CALIBRATION_GRAIN,
+            "-c:v", "libx264", "-preset", "ultrafast", "-crf", "16", "-pix_fmt", "yuv420p",
+            path,
+        ],
+        check=True,
+        capture_output=True,
+    )
+
+
+def _encode_speed(ffmpeg_path: str, clip: str, preset: str, threads: Optional[int], concurrent: int = 1) -> float:
+    """
+    Real-time factor of a 1080x1920 libx264 encode of the clip (output
+    discarded) while `concurrent` identical encodes run: the slowest one's.
+    """
+    cmd = [
+        ffmpeg_path, "-y", "-hide_banner", "-loglevel", "error", "-i", clip,
+        "-vf", CALIBRATION_FILTER, "-c:v", "libx264", "-preset", preset, "-crf", str(DEFAULT_CRF),
+    ]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    cmd += ["-an", "-f", "null", "-"]
+    started = time.monotonic()
+    processes = [
+        subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) for _ in range(max(1, concurrent))
+    ]
+    failed = None
+    for process in processes:
+        _, stderr = process.communicate()
+        if process.returncode != 0:
+            failed = subprocess.CalledProcessError(process.returncode, cmd, stderr=stderr)
+    if failed:
+        raise failed
+    return ENCODER_CALIBRATION_SEC / max(1e-6, time.monotonic() - started)
+
+
+def _calibrate(ffmpeg_path: str, loads: Dict[str, int]) -> dict:
+    speeds: Dict[str, Dict[str, float]] = {}
+    presets: Dict[str, str] = {}
+    with tempfile.TemporaryDirectory(prefix="shortdrama-calibration-") as tmp:
+        clip = os.path.join(tmp, "calibration.mp4")
+        _make_calibration_clip(ffmpeg_path, clip)
+        for key, concurrent in loads.items():
+            speeds[key] = {}
+            # Presets get monotonically slower: stop at the first one below target
+            chosen = ENCODER_PRESETS[0]
+            for preset in ENCODER_PRESETS:
+                speed = _encode_speed(ffmpeg_path, clip, preset, int(key) or None, concurrent)
+                speeds[key][preset] = round(speed, 3)
+                if speed < ENCODER_TARGET_SPEED * CALIBRATION_HEADROOM:
+                    break
+                chosen = preset
+            presets[key] = chosen
+    return {"presets": presets, "speeds": speeds, "concurrency": loads}
+
+
+def calibrate_encoder(ffmpeg_path: str = "ffmpeg", encodes: Iterable[Tuple[Optional[int], int]] = ((None, 1),)):
+    """
+    Pick the libx264 preset per thread count (see module docstring), from the
+    on-disk calibration when it matches this host, otherwise by benchmark.
+    encodes lists (ffmpeg threads, encodes running at once with them) for
+    every way the worker encodes. No-op when ENCODER_PRESET is fixed or
+    libx264 is unavailable.
+    """
+    if ENCODER_PRESET != "auto" or "libx264" not in available_encoders(ffmpeg_path):
+        return
+    # Thread count -> concurrent encodes; the busiest one wins if a thread count repeats
+    loads: Dict[str, int] = {}
+    for threads, concurrent in encodes:
+        key = _threads_key(threads)
+        loads[key] = max(loads.get(key, 1), concurrent)
+    loads = dict(sorted(loads.items(), key=lambda item: int(item[0])))
+    fingerprint = host_fingerprint(ffmpeg_path)
+
+    cached = {}
+    try:
+        with open(ENCODER_CALIBRATION_FILE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        pass
+    cached_loads = cached.get("concurrency", {})
+    if cached.get("host") == fingerprint and all(
+        key in cached.get("presets", {}) and cached_loads.get(key) == concurrent for key, concurrent in loads.items()
+    ):
+        _presets.update(cached["presets"])
+        print(f"[Encoder] Using calibrated libx264 presets {cached['presets']} (threads -> preset)", flush=True)
+        return
+
+    print(
+        f"[Encoder] Calibrating libx264 presets for {ENCODER_TARGET_SPEED}x real time "
+        f"(threads -> concurrent encodes: {loads})...",
+        flush=True,
+    )
+    started = time.monotonic()
+    try:
+        result = _calibrate(ffmpeg_path, loads)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"[Encoder] Calibration failed, using preset {DEFAULT_PRESET}: {e}", flush=True)
+        return
+    _presets.update(result["presets"])
+    print(
+        f"[Encoder] Calibrated in {time.monotonic() - started:.1f}s: presets {result['presets']}, "
+        f"speeds {result['speeds']}",
+        flush=True,
+    )
+
+    # Keep results for other thread counts measured on this host before
+    if cached.get("host") == fingerprint:
+        result["presets"] = {**cached.get("presets", {}), **result["presets"]}
+        result["speeds"] = {**cached.get("speeds", {}), **result["speeds"]}
+        result["concurrency"] = {**cached_loads, **result["concurrency"]}
+    tmp = f"{ENCODER_CALIBRATION_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"host": fingerprint, **result}, f, indent=2)
+        os.replace(tmp, ENCODER_CALIBRATION_FILE)
+    except OSError as e:
+        print(f"[Encoder] Failed to store calibration: {e}", flush=True)
@@ -0,0 +1,324 @@
+"""
+Frame Sources for ShortDrama Worker analysis
+
+Smart crop only looks at every Nth frame and smart thumbnails only at a few
+timestamps, so decoding and converting every frame is wasted work. A
+FrameSource yields just the frames an analysis asks for:
+
+- "grab":     OpenCV; grab() every frame (demux + decode only) and retrieve()
+              (colour conversion) on sampled frames
+- "ffmpeg":   ffmpeg rawvideo pipe with a select filter, so unsampled frames
+              never leave ffmpeg, and optional output scaling
+- "keyframe": ffmpeg decoding keyframes only (-skip_frame nokey); fastest,
+              sample spacing follows the source GOP
+
+All backends yield (frame_number, BGR frame) with frame numbers in the
+source's frame numbering, and report the source dimensions in `info` even
+when frames are scaled down.
+
+A source can be limited to [start_sec, start_sec+duration_sec) of the video:
+it seeks there directly, and frame numbers (and frame_at timestamps) are then
+relative to the start of the range. `range_frames` is the range's length.
+
+frames() reuses its decode/scale buffers: a yielded frame is only valid
+until the next one is requested, so copy it if it must be kept.
+"""
+
+import os
+import queue
+import re
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from media_probe import ffmpeg_path, probe_media
+
+FRAME_SOURCE = os.environ.get("ANALYSIS_FRAME_SOURCE", "grab").lower()
+FRAME_SOURCE_BACKENDS = ("grab", "ffmpeg", "keyframe")
+
+
+@dataclass
+class VideoInfo:
+    """Source video properties (frame sizes refer to the source, not scaled frames)."""
+    width: int
+    height: int
+    fps: float
+    total_frames: int
+
+    @property
+    def duration(self) -> float:
+        return self.total_frames / self.fps if self.fps > 0 else 0.0
+
+
+def probe_video_info(video_path: str) -> VideoInfo:
+    info = probe_media(video_path)
+    video = info.video if info else None
+    if video is None:
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    # Decoders apply the rotation, so frames come out in display orientation
+    width, height = video.display_size
+    return VideoInfo(width=width, height=height, fps=video.fps, total_frames=video.frame_count)
+
+
+def scaled_size(width: int, height: int, max_edge: Optional[int]) -> Tuple[int, int]:
+    """(width, height) with the long edge capped at max_edge, rounded to even."""
+    if not max_edge or max(width, height) <= max_edge:
+        return width, height
+    scale = max_edge / max(width, height)
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+class FrameSource(ABC):
+    """Base class: sampled frame iteration plus random access by timestamp."""
+
+    def __init__(
+        self,
+        video_path: str,
+        sample_interval: int = 1,
+        max_edge: Optional[int] = None,
+        start_sec: Optional[float] = None,
+        duration_sec: Optional[float] = None,
+        threads: Optional[int] = None,
+    ):
+        self.video_path = video_path
+        self.threads = threads  # decoder threads (None = decoder default)
+        self.sample_interval = max(1, sample_interval)
+        self.max_edge = max_edge
+        self.info = probe_video_info(video_path)
+        self.frame_size = scaled_size(self.info.width, self.info.height, max_edge)
+
+        fps = self.info.fps or 30.0
+        self.start_frame = min(self.info.total_frames, int(round(max(0.0, start_sec or 0.0) * fps)))
+        self.start_sec = self.start_frame / fps
+        self.range_frames = self.info.total_frames - self.start_frame
+        if duration_sec:
+            self.range_frames = min(self.range_frames, int(round(duration_sec * fps)))
+        self.duration_sec = duration_sec
+
+    @abstractmethod
+    def frames(self) -> Iterator[Tuple[int, np.ndarray]]:
+        ...
+
+    @abstractmethod
+    def frame_at(self, timestamp_sec: float) -> Optional[np.ndarray]:
+        ...
+
+    def _resize(self, frame: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        if (frame.shape[1], frame.shape[0]) == self.frame_size:
+            return frame
+        return cv2.resize(frame, self.frame_size, dst=dst, interpolation=cv2.INTER_AREA)
+
+    def _frame_buffer(self) -> np.ndarray:
+        w, h = self.frame_size
+        return np.empty((h, w, 3), dtype=np.uint8)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GrabFrameSource(FrameSource):
+    """OpenCV capture that only retrieves (converts) sampled frames."""
+
+    # frame_at() decodes forward instead of seeking when the target is at most
+    # this far ahead (a seek restarts decoding at the previous keyframe)
+    FORWARD_GRAB_SEC = 2.0
+
+    def __init__(self, video_path: str, *args, **kwargs):
+        super().__init__(video_path, *args, **kwargs)
+        if self.threads:
+            self._cap = cv2.VideoCapture(video_path, cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, self.threads])
+        else:
+            self._cap = cv2.VideoCapture(video_path)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Cannot open video: {video_path}")
+
+    def frames(self) -> Iterator[Tuple[int, np.ndarray]]:
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+        decoded = None
+        scaled = self._frame_buffer() if self.frame_size != (self.info.width, self.info.height) else None
+        frame_number = 0
+        while frame_number < self.range_frames and self._cap.grab():
+            if frame_number % self.sample_interval == 0:
+                ret, decoded = self._cap.retrieve(decoded)
+                if ret and decoded is not None:
+                    yield frame_number, self._resize(decoded, scaled)
+            frame_number += 1
+
+    def frame_at(self, timestamp_sec: float) -> Optional[np.ndarray]:
+        # One capture serves every timestamp; seeking is cheaper than reopening,
+        # and grabbing forward is cheaper than seeking for nearby timestamps
+        fps = self.info.fps or 30.0
+        target = int(round((self.start_sec + timestamp_sec) * fps))
+        ahead = target - int(self._cap.get(cv2.CAP_PROP_POS_FRAMES))
+        if 0 <= ahead <= self.FORWARD_GRAB_SEC * fps:
+            for _ in range(ahead):
+                if not self._cap.grab():
+                    return None
+        else:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        ret, frame = self._cap.read()
+        return self._resize(frame) if ret and frame is not None else None
+
+    def close(self):
+        self._cap.release()
+
+
+class FfmpegFrameSource(FrameSource):
+    """
+    ffmpeg decoding into a rawvideo pipe. The select filter drops unsampled
+    frames inside ffmpeg and scale shrinks the rest before they are copied out.
+    """
+
+    keyframes_only = False
+
+    def _input_args(self, start_sec: Optional[float] = None, skip_frame: Optional[str] = None) -> list:
+        """Input arguments; start_sec is relative to the range start."""
+        args = [ffmpeg_path(), "-hide_banner", "-nostdin", "-loglevel", "info"]
+        if self.video_path.startswith(("http://", "https://")):
+            args += ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "10"]
+        if self.threads:
+            args += ["-filter_threads", str(self.threads), "-threads", str(self.threads)]
+        if skip_frame:
+            args += ["-skip_frame", skip_frame]
+        seek = self.start_sec + (start_sec or 0.0)
+        if seek > 0:
+            args += ["-ss", f"{seek:.3f}"]
+        return args + ["-i", self.video_path, "-an", "-sn"]
+
+    def _output_args(self) -> list:
+        return ["-fps_mode", "passthrough", "-pix_fmt", "bgr24", "-f", "rawvideo", "pipe:1"]
+
+    def _filters(self, select: Optional[str] = None) -> list:
+        w, h = self.frame_size
+        filters = []
+        if select:
+            filters.append(f"select='{select}'")
+        elif not self.keyframes_only and self.sample_interval > 1:
+            filters.append(f"select='not(mod(n\\,{self.sample_interval}))'")
+        filters.append("showinfo")
+        if (w, h) != (self.info.width, self.info.height):
+            filters.append(f"scale={w}:{h}:flags=area")
+        return filters
+
+    def _read_frames(self, cmd: list) -> Iterator[Tuple[float, np.ndarray]]:
+        """Run ffmpeg and yield (pts_time, frame); showinfo on stderr gives timestamps."""
+        w, h = self.frame_size
+        frame_bytes = w * h * 3
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=frame_bytes)
+        pts_times: queue.Queue = queue.Queue()
+        frame = self._frame_buffer()
+        view = memoryview(frame.reshape(-1))
+
+        def read_stderr():
+            for line in iter(proc.stderr.readline, b""):
+                m = re.search(rb"pts_time:\s*(-?[\d.]+)", line)
+                if m:
+                    pts_times.put(float(m.group(1)))
+            pts_times.put(None)
+
+        reader = threading.Thread(target=read_stderr, daemon=True)
+        reader.start()
+        try:
+            while True:
+                filled = 0
+                while filled < frame_bytes:
+                    n = proc.stdout.readinto(view[filled:])
+                    if not n:
+                        break
+                    filled += n
+                if filled < frame_bytes:
+                    break
+                pts = pts_times.get()
+                if pts is None:
+                    break
+                yield pts, frame
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+            reader.join()
+            proc.stderr.close()
+
+    def frames(self) -> Iterator[Tuple[int, np.ndarray]]:
+        fps = self.info.fps or 30.0
+        cmd = self._input_args(skip_frame="nokey" if self.keyframes_only else None)
+        if self.duration_sec:
+            cmd += ["-t", f"{self.range_frames / fps:.3f}"]
+        cmd += ["-vf", ",".join(self._filters())] + self._output_args()
+        for pts, frame in self._read_frames(cmd):
+            frame_number = int(round(pts * fps))
+            if frame_number >= self.range_frames:
+                break
+            yield frame_number, frame
+
+    def frames_every(self, interval_sec: float, skip_frame: Optional[str] = "bidir") -> Iterator[Tuple[float, np.ndarray]]:
+        """
+        (timestamp, frame) for the first decoded frame of every interval_sec,
+        selected inside ffmpeg. skip_frame is passed to the decoder: with
+        "bidir" B-frames are never decoded, which roughly halves the decode
+        cost of a typical H.264 stream (the I/P frames left are also its
+        best-quality pictures); None decodes every frame.
+        """
+        select = f"isnan(prev_selected_t)+gte(t-prev_selected_t\\,{interval_sec:.3f})"
+        cmd = self._input_args(skip_frame=skip_frame)
+        if self.duration_sec:
+            cmd += ["-t", f"{self.range_frames / (self.info.fps or 30.0):.3f}"]
+        cmd += ["-vf", ",".join(self._filters(select))] + self._output_args()
+        yield from self._read_frames(cmd)
+
+    def frame_at(self, timestamp_sec: float) -> Optional[np.ndarray]:
+        w, h = self.frame_size
+        filters = ["showinfo"]
+        if (w, h) != (self.info.width, self.info.height):
+            filters.append(f"scale={w}:{h}:flags=area")
+        cmd = (
+            self._input_args(max(0.0, timestamp_sec))
+            + ["-frames:v", "1", "-vf", ",".join(filters)]
+            + self._output_args()
+        )
+        for _, frame in self._read_frames(cmd):
+            return frame
+        return None
+
+
+class KeyframeFrameSource(FfmpegFrameSource):
+    """Decode keyframes only; the decoder skips every other frame outright."""
+
+    keyframes_only = True
+
+
+def open_frame_source(
+    video_path: str,
+    sample_interval: int = 1,
+    max_edge: Optional[int] = None,
+    backend: Optional[str] = None,
+    start_sec: Optional[float] = None,
+    duration_sec: Optional[float] = None,
+    threads: Optional[int] = None,
+) -> FrameSource:
+    """
+    Create a FrameSource; backend defaults to ANALYSIS_FRAME_SOURCE ("grab").
+    start_sec/duration_sec limit it to a range of the video, threads caps
+    its decoder threads.
+    """
+    backend = (backend or FRAME_SOURCE).lower()
+    args = (video_path, sample_interval, max_edge, start_sec, duration_sec, threads)
+    if backend == "ffmpeg":
+        return FfmpegFrameSource(*args)
+    if backend == "keyframe":
+        return KeyframeFrameSource(*args)
+    if backend != "grab":
+        print(f"[FrameSource] Unknown backend '{backend}', using grab", flush=True)
+    return GrabFrameSource(*args)
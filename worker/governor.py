@@ -0,0 +1,158 @@
+"""
+Resource Governor for ShortDrama Worker
+
+Lets one worker process run several job slots on a big host without the
+slots oversubscribing it. The machine's cores are divided between the slots,
+and each slot's share is split between ffmpeg encode threads, smart-crop
+analysis decode threads, thumbnail workers and uploads (ResourceBudget).
+
+A slot only claims a new job when the host has headroom: enough available
+memory, and a load average that leaves room for the slot's cores.
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class ResourceBudget:
+    """CPU share handed to one job slot."""
+    cores: int
+    encode_workers: int  # episodes encoded concurrently in SPLIT_SERIES
+    thumbnail_workers: int  # episodes picking their thumbnails concurrently in a single-pass split
+    upload_workers: int  # concurrent uploads (network bound, not counted against cores)
+    machine_cores: int  # cores on the host, shared by every slot
+
+    @classmethod
+    def for_cores(
+        cls,
+        cores: int,
+        encode_workers: int = 0,
+        upload_workers: int = 2,
+        machine_cores: Optional[int] = None,
+    ) -> "ResourceBudget":
+        """Split `cores` between encodes (~4 cores per libx264 encode) and thumbnail selection."""
+        cores = max(1, cores)
+        if encode_workers <= 0:
+            encode_workers = max(1, cores // 4)
+        return cls(
+            cores=cores,
+            encode_workers=min(encode_workers, cores),
+            thumbnail_workers=max(1, cores // 4),
+            upload_workers=max(1, upload_workers),
+            machine_cores=max(cores, machine_cores or os.cpu_count() or 1),
+        )
+
+    def encode_threads(self, concurrent: int = 1) -> Optional[int]:
+        """
+        ffmpeg -threads for one of `concurrent` simultaneous encodes.
+        None when a single encode owns the whole machine (keep ffmpeg's default).
+        """
+        concurrent = max(1, concurrent)
+        if concurrent == 1 and self.cores >= self.machine_cores:
+            return None
+        return max(1, self.cores // concurrent)
+
+    def analysis_threads(self) -> Optional[int]:
+        """
+        Decoder threads for a smart-crop analysis (one per job, ahead of the encodes).
+        None when the slot owns the whole machine (keep the decoder's default).
+        """
+        if self.cores >= self.machine_cores:
+            return None
+        return self.cores
+
+
+def available_memory_mb() -> Optional[int]:
+    """Available physical memory in MB, or None if it cannot be determined."""
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        pages = os.sysconf("SC_AVPHYS_PAGES")
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        return (pages * page_size) // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def load_average() -> Optional[float]:
+    """1-minute load average, or None on platforms without it (Windows)."""
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+
+
+class ResourceGovernor:
+    """
+    Hands out ResourceBudgets to job slots.
+
+    Usage per slot:
+        budget = governor.try_acquire()
+        if budget is None: wait and retry
+        try: claim and run a job with `budget`
+        finally: governor.release()
+    """
+
+    def __init__(
+        self,
+        slots: int,
+        total_cores: Optional[int] = None,
+        encode_workers: int = 0,
+        upload_workers: int = 2,
+        min_free_memory_mb: int = 1024,
+        max_load_per_core: float = 1.25,
+    ):
+        self.slots = max(1, slots)
+        self.total_cores = max(1, total_cores or os.cpu_count() or 1)
+        self.budget = ResourceBudget.for_cores(
+            self.total_cores // self.slots, encode_workers, upload_workers, self.total_cores
+        )
+        self.min_free_memory_mb = min_free_memory_mb
+        self.max_load_per_core = max_load_per_core
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def has_headroom(self) -> bool:
+        """True if another slot can start a job now."""
+        if self._active >= self.slots:
+            return False
+
+        free_mb = available_memory_mb()
+        if free_mb is not None and free_mb < self.min_free_memory_mb:
+            return False
+
+        # The first running slot never waits on load: it would only be waiting on
+        # other processes, and the slot count already caps what we add ourselves.
+        load = load_average()
+        if self._active > 0 and load is not None:
+            if load + self.budget.cores > self.total_cores * self.max_load_per_core:
+                return False
+        return True
+
+    def try_acquire(self) -> Optional[ResourceBudget]:
+        """Reserve a slot if there is headroom; returns its budget or None."""
+        with self._lock:
+            if not self.has_headroom():
+                return None
+            self._active += 1
+            return self.budget
+
+    def release(self):
+        with self._lock:
+            self._active = max(0, self._active - 1)
+
+    def describe(self) -> str:
+        b = self.budget
+        return (
+            f"{self.slots} slot(s) x {b.cores} core(s): "
+            f"{b.encode_workers} encode(s), {b.thumbnail_workers} thumbnail worker(s), "
+            f"{b.upload_workers} upload(s) per slot"
+        )
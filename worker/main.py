@@ -1,19 +1,32 @@
+import bisect
+import itertools
 import json
 import os
 import subprocess
 import tempfile
+import threading
 import time
 from datetime import datetime
 
 import boto3
 import requests
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
 from dotenv import load_dotenv
 
+from downloader import download_ranged
+from encoder_tuning import available_encoders, calibrate_encoder, libx264_args
+from governor import ResourceBudget, ResourceGovernor
+from media_probe import probe_media, set_ffmpeg_path
+from pipeline import Stage, run_pipeline
+
 load_dotenv() # Load environment variables from .env file
 
 # Smart crop module for AI-powered face-tracking crop
 try:
-    from smart_crop import smart_crop_video
+    from analysis_cache import AnalysisCache, content_fingerprint
+    from smart_crop import crop_path_terms, slice_smart_crop_result, smart_crop_video, thumbnail_candidates
+    from models import preload_models
     SMART_CROP_AVAILABLE = True
     print("[Worker] Smart crop module loaded successfully", flush=True)
 except ImportError as e:
@@ -31,6 +44,67 @@ S3_SECRET_KEY = os.environ.get("S3_SECRET_KEY", "minioadmin")
 S3_BUCKET_RAW = os.environ.get("S3_BUCKET_RAW", "shortdrama-raw")
 S3_BUCKET_PROCESSED = os.environ.get("S3_BUCKET_PROCESSED", "shortdrama-processed")
 
+# S3 transfer tuning, shared by every job and thread in this process
+S3_MULTIPART_THRESHOLD_MB = int(os.environ.get("S3_MULTIPART_THRESHOLD_MB") or 16)
+S3_MULTIPART_CHUNK_MB = int(os.environ.get("S3_MULTIPART_CHUNK_MB") or 16)
+S3_MAX_CONCURRENCY = int(os.environ.get("S3_MAX_CONCURRENCY") or 8)  # parallel parts per file
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get("S3_MAX_POOL_CONNECTIONS") or 0)  # 0 = derive from concurrency
+# Streaming integrity checksum sent with every upload/part (CRC32, CRC32C, SHA1, SHA256; empty = off)
+S3_CHECKSUM_ALGORITHM = os.environ.get("S3_CHECKSUM_ALGORITHM", "CRC32").strip().upper()
+
+# Source ingest:
+# - download: copy the whole raw video to local scratch before processing
+# - stream: let ffmpeg/OpenCV read the object directly (presigned S3 URL or the source URL)
+INGEST_MODE = os.environ.get("INGEST_MODE", "download").strip().lower()
+INGEST_URL_TTL_SEC = int(os.environ.get("INGEST_URL_TTL_SEC") or 6 * 3600)
+
+# SPLIT_SERIES mode:
+# - single_pass: decode the source once and write every episode from one ffmpeg run (segment muxer)
+# - per_episode: legacy mode, one process_video call (and one full decode) per episode
+SPLIT_MODE = os.environ.get("SPLIT_MODE", "single_pass").strip().lower()
+
+# Episodes handled concurrently by SPLIT_SERIES (0 = derive from the CPU count)
+SPLIT_WORKERS = int(os.environ.get("SPLIT_WORKERS") or 0)
+# Concurrent upload workers in the SPLIT_SERIES pipeline
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS") or 2)
+# SPLIT_SERIES checkpoints (manifest of uploaded episodes, reused when the job is retried):
+# - bucket: job scratch dir and the processed bucket (retries on any worker resume)
+# - local: job scratch dir only
+# - off: every attempt starts from episode 1
+SPLIT_CHECKPOINT = os.environ.get("SPLIT_CHECKPOINT", "bucket").strip().lower()
+# Episode cuts move to the nearest source keyframe within this many seconds (0 = exact cuts)
+SPLIT_KEYFRAME_TOLERANCE_SEC = float(os.environ.get("SPLIT_KEYFRAME_TOLERANCE_SEC") or 2.0)
+# Cut sources that already match the output spec by stream copy (no decode or encode)
+SPLIT_STREAM_COPY = os.environ.get("SPLIT_STREAM_COPY", "true").strip().lower() in ("1", "true", "yes")
+
+# Concurrent job slots in this worker process; cores are divided between slots
+WORKER_SLOTS = int(os.environ.get("WORKER_SLOTS") or 1)
+# A slot only claims a job while this much memory is available...
+WORKER_MIN_FREE_MEMORY_MB = int(os.environ.get("WORKER_MIN_FREE_MEMORY_MB") or 1024)
+# ...and the load average leaves room for its cores (load <= cores * factor)
+WORKER_MAX_LOAD_PER_CORE = float(os.environ.get("WORKER_MAX_LOAD_PER_CORE") or 1.25)
+
+# Smart crop framing:
+# - static: one crop window per episode at the average face position
+# - dynamic: the crop window pans along the face track (piecewise-linear path in the encode's -vf)
+SMART_CROP_MODE = os.environ.get("SMART_CROP_MODE", "static").strip().lower()
+
+# Smart-crop analysis cache: results keyed by a sampled source fingerprint on local disk (LRU, 0 MB disables),
+# optionally shared through a bucket so retries on other workers hit as well
+ANALYSIS_CACHE_DIR = os.environ.get("ANALYSIS_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "shortdrama-analysis-cache")
+ANALYSIS_CACHE_MAX_MB = int(os.environ.get("ANALYSIS_CACHE_MAX_MB") or 1024)
+ANALYSIS_CACHE_BUCKET = os.environ.get("ANALYSIS_CACHE_BUCKET", "").strip()
+
+DEFAULT_VERTICAL_FILTER = "scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920"
+# What every encode produces: H.264 yuv420p 1080x1920 with AAC audio
+OUTPUT_SIZE = (1080, 1920)
+
+# Sources already in the output format are remuxed (+faststart) instead of analyzed and
+# re-encoded, as long as their bitrates stay within these limits (kb/s)
+PASSTHROUGH = os.environ.get("PASSTHROUGH", "true").strip().lower() in ("1", "true", "yes")
+PASSTHROUGH_MAX_VIDEO_KBPS = int(os.environ.get("PASSTHROUGH_MAX_VIDEO_KBPS") or 8000)
+PASSTHROUGH_MAX_AUDIO_KBPS = int(os.environ.get("PASSTHROUGH_MAX_AUDIO_KBPS") or 320)
+
 # FFmpeg path - try system PATH first, fallback to common Windows location
 FFMPEG_PATH = "ffmpeg"  # Default: use PATH
 if os.name == 'nt' and not os.system("where ffmpeg >nul 2>&1"):  # Windows
@@ -41,6 +115,22 @@ if os.name == 'nt' and not os.system("where ffmpeg >nul 2>&1"):  # Windows
         if os.path.exists(r"C:\ffmpeg\bin\ffmpeg.exe"):
             FFMPEG_PATH = r"C:\ffmpeg\bin\ffmpeg.exe"
             print(f"[Worker] Using FFmpeg from: {FFMPEG_PATH}", flush=True)
+set_ffmpeg_path(FFMPEG_PATH)
+
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+    multipart_chunksize=S3_MULTIPART_CHUNK_MB * 1024 * 1024,
+    max_concurrency=S3_MAX_CONCURRENCY,
+    use_threads=True,
+)
+
+
+def s3_pool_connections() -> int:
+    """Enough pooled connections for every slot's uploads to run all their parts at once."""
+    if S3_MAX_POOL_CONNECTIONS > 0:
+        return S3_MAX_POOL_CONNECTIONS
+    return max(10, WORKER_SLOTS * UPLOAD_WORKERS * S3_MAX_CONCURRENCY + 4)
 
 
 def s3_client():
@@ -50,9 +140,60 @@ def s3_client():
         endpoint_url=S3_ENDPOINT,
         aws_access_key_id=S3_ACCESS_KEY,
         aws_secret_access_key=S3_SECRET_KEY,
+        config=BotoConfig(
+            max_pool_connections=s3_pool_connections(),
+            retries={"max_attempts": 5, "mode": "adaptive"},
+            tcp_keepalive=True,
+        ),
     )
 
 
+_shared_s3 = None
+_shared_s3_lock = threading.Lock()
+
+
+def shared_s3_client():
+    """
+    Process-wide S3 client. boto3 clients are thread-safe, so every job, slot and
+    upload thread reuses one connection pool instead of building a client per job.
+    """
+    global _shared_s3
+    with _shared_s3_lock:
+        if _shared_s3 is None:
+            _shared_s3 = s3_client()
+        return _shared_s3
+
+
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+
+def analysis_cache():
+    """Process-wide smart-crop analysis cache, or None when disabled."""
+    global _analysis_cache
+    if not SMART_CROP_AVAILABLE or ANALYSIS_CACHE_MAX_MB <= 0:
+        return None
+    with _analysis_cache_lock:
+        if _analysis_cache is None:
+            _analysis_cache = AnalysisCache(
+                ANALYSIS_CACHE_DIR,
+                ANALYSIS_CACHE_MAX_MB * 1024 * 1024,
+                s3=shared_s3_client() if ANALYSIS_CACHE_BUCKET else None,
+                bucket=ANALYSIS_CACHE_BUCKET or None,
+            )
+        return _analysis_cache
+
+
+def analysis_content_key(source_path: str, start_sec: float | None = None, duration_sec: float | None = None) -> str | None:
+    """Cache identity of [start, start+duration) of a source (None if it cannot be fingerprinted)."""
+    if not SMART_CROP_AVAILABLE:
+        return None
+    fingerprint = content_fingerprint(source_path)
+    if not fingerprint:
+        return None
+    return f"{fingerprint}:{start_sec or 0}:{duration_sec or 0}"
+
+
 def claim_job():
     r = requests.post(
         f"{API_BASE_URL}/worker/jobs/claim",
@@ -96,6 +237,11 @@ def job_progress(job_id: str, progress_pct: int, stage: str, message: str | None
         pass
 
 
+def default_budget() -> ResourceBudget:
+    """Budget for a job when no governor is involved: the whole machine."""
+    return ResourceBudget.for_cores(os.cpu_count() or 1, SPLIT_WORKERS, UPLOAD_WORKERS)
+
+
 def run(cmd: list[str]):
     # Replace 'ffmpeg' with FFMPEG_PATH if needed
     if cmd and cmd[0] == "ffmpeg":
@@ -106,71 +252,76 @@ def run(cmd: list[str]):
     return p.stdout
 
 
-def ffprobe_duration_sec(path: str) -> int | None:
+def is_url(path: str) -> bool:
+    return path.startswith(("http://", "https://"))
+
+
+def seconds_arg(sec: float) -> str:
+    """A time for the ffmpeg command line (millisecond precision, no float noise)."""
+    return f"{sec:.3f}".rstrip("0").rstrip(".")
+
+
+def ffmpeg_input_args(input_path: str, start_sec: float | None = None) -> list[str]:
     """
-    Get video duration using ffmpeg (more reliable than ffprobe on Windows).
+    Input arguments for a local file or a streamed URL.
+    Seeking is input-side: ffmpeg jumps to the keyframe before start_sec and
+    only decodes from there (still frame-accurate when re-encoding), and a clip
+    from the middle of a remote source never pulls the bytes before it. URLs
+    also get reconnect options.
     """
-    try:
-        print(f"[DEBUG] Running ffmpeg to detect duration: {path}", flush=True)
-        
-        # Use ffmpeg -i to get file info (outputs to stderr)
-        result = subprocess.run(
-            [FFMPEG_PATH, "-i", path],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        # Parse duration from stderr (format: Duration: HH:MM:SS.ms)
-        output = result.stderr
-        print(f"[DEBUG] ffmpeg output length: {len(output)} chars", flush=True)
-        
-        import re
-        duration_match = re.search(r'Duration:\s*(\d+):(\d+):(\d+\.\d+)', output)
-        
-        if duration_match:
-            hours = int(duration_match.group(1))
-            minutes = int(duration_match.group(2))
-            seconds = float(duration_match.group(3))
-            total_seconds = hours * 3600 + minutes * 60 + seconds
-            duration = max(1, int(total_seconds))
-            print(f"[DEBUG] Detected duration: {hours}h {minutes}m {seconds:.1f}s = {duration} seconds", flush=True)
-            return duration
-        else:
-            print(f"[DEBUG] Could not parse duration from ffmpeg output", flush=True)
-            # Try to show first 500 chars of output for debugging
-            print(f"[DEBUG] First 500 chars: {output[:500]}", flush=True)
-            return None
-        
-    except subprocess.TimeoutExpired:
-        print(f"[DEBUG] ffmpeg timeout after 30s", flush=True)
-        return None
-    except FileNotFoundError:
-        print(f"[DEBUG] ffmpeg not found in PATH", flush=True)
-        return None
-    except Exception as e:
-        print(f"[DEBUG] ffmpeg exception: {e}", flush=True)
-        import traceback
-        traceback.print_exc()
+    args = []
+    if is_url(input_path):
+        args += [
+            "-reconnect", "1",
+            "-reconnect_streamed", "1",
+            "-reconnect_on_network_error", "1",
+            "-reconnect_delay_max", "10",
+        ]
+    if start_sec is not None and start_sec > 0:
+        args += ["-ss", seconds_arg(start_sec)]
+    return args + ["-i", input_path]
+
+
+def ffprobe_duration_sec(path: str) -> int | None:
+    """Duration in whole seconds (at least 1), or None if the file cannot be probed."""
+    info = probe_media(path)
+    if info is None or info.duration <= 0:
+        print(f"[Worker] Could not detect duration: {path}", flush=True)
         return None
+    return max(1, int(info.duration))
 
 
-def get_smart_crop_filter(input_path: str, job_id: str, report_progress: bool = True) -> str:
+def get_smart_crop_result(
+    input_path: str,
+    job_id: str,
+    report_progress: bool = True,
+    content_key: str | None = None,
+    on_progress=None,
+    start_sec: float | None = None,
+    duration_sec: float | None = None,
+    threads: int | None = None,
+) -> dict | None:
     """
-    Analyze video and get smart crop filter using MediaPipe face detection.
-    Falls back to center crop if smart crop is not available or fails.
+    Analyze video with MediaPipe face detection and return the smart_crop_video result.
+    Returns None if smart crop is not available or fails (caller uses center crop).
+    start_sec/duration_sec limit the analysis to the range being encoded; the
+    analyzer seeks there in input_path itself.
+    content_key identifies what is analyzed (see analysis_content_key); it
+    defaults to the range of the file, and results are cached under it.
+    on_progress(pct) replaces the job progress reporting when given.
+    threads caps the analysis decoder threads (ResourceBudget.analysis_threads).
     """
-    default_filter = "scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920"
-    
     if not SMART_CROP_AVAILABLE:
         print(f"[Worker] Job {job_id}: Using default center crop (smart crop not available)", flush=True)
-        return default_filter
-    
+        return None
+
     try:
         print(f"[Worker] Job {job_id}: Analyzing video for smart crop...", flush=True)
         
         def progress_cb(pct, stage):
-            if report_progress:
+            if on_progress:
+                on_progress(pct)
+            elif report_progress:
                 job_progress(job_id, max(1, pct // 2), f"smart_crop_{stage}")
         
         result = smart_crop_video(
@@ -178,117 +329,74 @@ def get_smart_crop_filter(input_path: str, job_id: str, report_progress: bool =
             None,  # We don't output directly, just get the filter
             target_width=1080,
             target_height=1920,
-            progress_callback=progress_cb
+            progress_callback=progress_cb,
+            cache=analysis_cache(),
+            content_key=content_key or analysis_content_key(input_path, start_sec, duration_sec),
+            start_sec=start_sec,
+            duration_sec=duration_sec,
+            threads=threads,
         )
         
-        crop_filter = result.get("filter")
         strategy = result.get("strategy", "unknown")
-        
         print(f"[Worker] Job {job_id}: Smart crop strategy: {strategy}", flush=True)
-        print(f"[Worker] Job {job_id}: Using filter: {crop_filter}", flush=True)
-        
-        if crop_filter:
-            return crop_filter
-        else:
-            print(f"[Worker] Job {job_id}: Smart crop returned no filter, using default", flush=True)
-            return default_filter
-            
+        return result
+
     except Exception as e:
         print(f"[Worker] Job {job_id}: Smart crop failed ({e}), using center crop", flush=True)
-        return default_filter
+        return None
+
+
+def smart_crop_filter(result: dict | None, job_id: str) -> str:
+    """-vf chain for a smart crop result (center crop when there is none)."""
+    filter_key = "dynamic_filter" if SMART_CROP_MODE == "dynamic" else "filter"
+    crop_filter = (result.get(filter_key) or result.get("filter")) if result else None
+
+    if crop_filter:
+        print(f"[Worker] Job {job_id}: Using filter: {crop_filter}", flush=True)
+        return crop_filter
+    if result is not None:
+        print(f"[Worker] Job {job_id}: Smart crop returned no filter, using default", flush=True)
+    return DEFAULT_VERTICAL_FILTER
 
 
 def get_ffmpeg_encoder():
     """
     Check if NVIDIA GPU acceleration (NVENC) is available.
+    ffmpeg's encoder list is probed once per process (encoder_tuning).
     """
-    try:
-        # Quick check for nvenc support
-        result = subprocess.run([FFMPEG_PATH, "-encoders"], capture_output=True, text=True)
-        if "h264_nvenc" in result.stdout:
-            print("[Worker] NVIDIA GPU acceleration (NVENC) detected! Using GPU for encoding.", flush=True)
-            return "h264_nvenc"
-    except:
-        pass
-    print("[Worker] GPU acceleration not detected. Using CPU (libx264) for encoding.", flush=True)
+    if "h264_nvenc" in available_encoders(FFMPEG_PATH):
+        return "h264_nvenc"
     return "libx264"
 
 
-def process_video(
-    job_id: str,
-    input_path: str,
-    out_dir: str,
-    start_sec: int | None = None,
-    duration_sec: int | None = None,
-    report_progress: bool = True,
-):
-    os.makedirs(out_dir, exist_ok=True)
-    out_mp4 = os.path.join(out_dir, "vertical.mp4")
-    out_jpg = os.path.join(out_dir, "thumb.jpg")
-    out_srt = os.path.join(out_dir, "subs.srt")
-    out_json = os.path.join(out_dir, "meta.json")
-
-    duration_sec_in = duration_sec or ffprobe_duration_sec(input_path) or 1
-    encoder = get_ffmpeg_encoder()
-
-    # For segments with start_sec, we need to extract the segment first before analyzing
-    # This ensures smart crop analyzes the actual content being cropped
-    segment_input = input_path
-    temp_segment = None
-    
-    if start_sec is not None and start_sec > 0:
-        # Extract segment to a temp file for analysis
-        temp_segment = os.path.join(out_dir, "temp_segment.mp4")
-        extract_cmd = ["ffmpeg", "-y", "-i", input_path, "-ss", str(int(start_sec))]
-        if duration_sec is not None and duration_sec > 0:
-            extract_cmd += ["-t", str(int(duration_sec))]
-        extract_cmd += ["-c", "copy", temp_segment]
-        
-        try:
-            run(extract_cmd)
-            segment_input = temp_segment
-        except Exception as e:
-            print(f"[Worker] Job {job_id}: Segment extraction failed, using original: {e}", flush=True)
-    
-    # Get smart crop filter (analyzes faces in video)
-    video_filter = get_smart_crop_filter(segment_input, job_id, report_progress)
-
-    # Encode with progress
-    # Hardware acceleration flags added
-    cmd = ["ffmpeg", "-y"]
-    if encoder == "h264_nvenc":
-        cmd += ["-hwaccel", "auto"] # Auto-detect hardware decoder
-    
-    cmd += ["-i", input_path]
-    
-    if start_sec is not None and start_sec > 0:
-        cmd += ["-ss", str(int(start_sec))]
-    if duration_sec is not None and duration_sec > 0:
-        cmd += ["-t", str(int(duration_sec))]
-    
-    cmd += [
-        "-vf", video_filter,
-        "-c:v", encoder,
-    ]
-
+def encoder_args(encoder: str, threads: int | None = None) -> list[str]:
+    """
+    Video codec arguments shared by every vertical encode. The libx264 preset
+    is the one calibrated at startup for `threads` ffmpeg threads.
+    """
+    args = ["-c:v", encoder]
     if encoder == "h264_nvenc":
-        cmd += ["-preset", "p4", "-tune", "hq"] # High quality GPU presets
+        args += ["-preset", "p4", "-tune", "hq"] # High quality GPU presets
     else:
-        cmd += ["-preset", "veryfast", "-crf", "23"]
+        args += libx264_args(threads)
+    if threads:
+        args += ["-threads", str(threads)]
+    return args
 
-    cmd += [
-        "-c:a", "aac",
-        "-b:a", "128k",
-        "-movflags", "+faststart",
-        "-progress", "pipe:1",
-        "-nostats",
-        out_mp4,
-    ]
 
-    if report_progress:
-        job_progress(job_id, 1, "encoding", "starting ffmpeg")
+def run_ffmpeg_with_progress(cmd: list[str], total_sec: float, on_progress=None, on_start=None):
+    """
+    Run an ffmpeg command that was given `-progress pipe:1` and report percent done.
+    on_progress(pct) is called at most every ~2% to reduce spam.
+    on_start(process) receives the Popen, e.g. to terminate a run that is no longer wanted.
+    """
+    if cmd and cmd[0] == "ffmpeg":
+        cmd = [FFMPEG_PATH] + cmd[1:]
     p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+    if on_start:
+        on_start(p)
     last_pct = 0
+    tail = []
     if p.stdout:
         for line in p.stdout:
             line = line.strip()
@@ -296,19 +404,33 @@ def process_video(
                 try:
                     out_ms = int(line.split("=", 1)[1])
                     out_sec = out_ms / 1_000_000.0
-                    pct = int(min(99, max(0, (out_sec / duration_sec_in) * 100)))
-                    if report_progress and pct >= last_pct + 2:  # reduce spam
+                    pct = int(min(99, max(0, (out_sec / (total_sec or 1)) * 100)))
+                    if on_progress and pct >= last_pct + 2:  # reduce spam
                         last_pct = pct
-                        job_progress(job_id, pct, "encoding")
+                        on_progress(pct)
                 except Exception:
                     pass
             elif line.startswith("progress=end"):
                 break
+            elif line and "=" not in line:
+                # Keep the last few log lines for the error message
+                tail = (tail + [line])[-20:]
     rc = p.wait()
     if rc != 0:
-        raise RuntimeError(f"ffmpeg failed with code {rc}")
-    if report_progress:
-        job_progress(job_id, 100, "encoding_done")
+        raise RuntimeError(f"ffmpeg failed with code {rc}\n" + "\n".join(tail))
+
+
+def finalize_outputs(job_id: str, out_dir: str, out_mp4: str, crop_result: dict | None = None):
+    """
+    Write subtitles, thumbnail and metadata next to an encoded vertical.mp4.
+    crop_result is the smart crop result of the encoded range; its analysis
+    already scored thumbnail candidates, so the thumbnail is picked from those
+    when there are any.
+    Returns (out_mp4, out_jpg, out_srt, out_json, duration_sec).
+    """
+    out_jpg = os.path.join(out_dir, "thumb.jpg")
+    out_srt = os.path.join(out_dir, "subs.srt")
+    out_json = os.path.join(out_dir, "meta.json")
 
     # Dummy subtitles for POC
     with open(out_srt, "w", encoding="utf-8") as f:
@@ -320,17 +442,24 @@ def process_video(
 
     # Smart thumbnail generation: analyze multiple frames and select the best one
     try:
-        from smart_thumbnail import generate_smart_thumbnail
+        from smart_thumbnail import generate_smart_thumbnail, generate_thumbnail_from_candidates
         
         print(f"[Worker] Job {job_id}: Generating smart thumbnail...", flush=True)
-        thumbnail_result = generate_smart_thumbnail(
-            video_path=out_mp4,
-            output_dir=out_dir,
-            target_width=1080,
-            target_height=1920,
-            job_id=job_id,
-            progress_callback=None  # Could enable if needed
-        )
+        candidates = thumbnail_candidates(crop_result, dynamic=SMART_CROP_MODE == "dynamic") if crop_result else []
+        thumbnail_result = {"error": "no_candidates"}
+        if candidates:
+            thumbnail_result = generate_thumbnail_from_candidates(
+                out_mp4, candidates, out_dir, target_width=1080, target_height=1920, job_id=job_id
+            )
+        if "error" in thumbnail_result:
+            thumbnail_result = generate_smart_thumbnail(
+                video_path=out_mp4,
+                output_dir=out_dir,
+                target_width=1080,
+                target_height=1920,
+                job_id=job_id,
+                progress_callback=None  # Could enable if needed
+            )
         
         if "error" in thumbnail_result:
             print(f"[Worker] Job {job_id}: Smart thumbnail failed, using fallback", flush=True)
@@ -362,27 +491,540 @@ def process_video(
     with open(out_json, "w", encoding="utf-8") as f:
         json.dump(meta, f, ensure_ascii=False, indent=2)
 
-    # Cleanup temp segment file if created
-    if temp_segment and os.path.exists(temp_segment):
+    return out_mp4, out_jpg, out_srt, out_json, duration_sec
+
+
+def video_filter_args(video_filter: str, script_dir: str) -> list[str]:
+    """
+    ffmpeg arguments for a video filter chain. Long chains (dynamic crop paths)
+    go through a filter script file to stay under command-line length limits
+    (32K characters on Windows).
+    """
+    if len(video_filter) <= 4000:
+        return ["-vf", video_filter]
+    script = os.path.join(script_dir, "video_filter.txt")
+    with open(script, "w", encoding="utf-8") as f:
+        f.write(video_filter)
+    return ["-filter_script:v", script]
+
+
+def encode_vertical(
+    input_path: str,
+    out_mp4: str,
+    video_filter: str,
+    start_sec: float | None = None,
+    duration_sec: float | None = None,
+    threads: int | None = None,
+    on_progress=None,
+):
+    """Encode input (optionally a [start, start+duration) range) to a vertical mp4."""
+    duration_sec_in = duration_sec or ffprobe_duration_sec(input_path) or 1
+    encoder = get_ffmpeg_encoder()
+
+    # Encode with progress
+    # Hardware acceleration flags added
+    cmd = ["ffmpeg", "-y"]
+    if encoder == "h264_nvenc":
+        cmd += ["-hwaccel", "auto"] # Auto-detect hardware decoder
+    
+    cmd += ffmpeg_input_args(input_path, start_sec)
+    
+    if duration_sec is not None and duration_sec > 0:
+        cmd += ["-t", seconds_arg(duration_sec)]
+    
+    cmd += video_filter_args(video_filter, os.path.dirname(out_mp4))
+    cmd += encoder_args(encoder, threads)
+    cmd += [
+        "-c:a", "aac",
+        "-b:a", "128k",
+        "-movflags", "+faststart",
+        "-progress", "pipe:1",
+        "-nostats",
+        out_mp4,
+    ]
+    run_ffmpeg_with_progress(cmd, duration_sec_in, on_progress)
+
+
+def remux_vertical(
+    input_path: str,
+    out_mp4: str,
+    start_sec: float | None = None,
+    duration_sec: float | None = None,
+    on_progress=None,
+):
+    """Copy a source that is already in the output format into out_mp4 (+faststart), optionally a range."""
+    duration_sec_in = duration_sec or ffprobe_duration_sec(input_path) or 1
+    cmd = ["ffmpeg", "-y"] + ffmpeg_input_args(input_path, start_sec)
+    if duration_sec is not None and duration_sec > 0:
+        cmd += ["-t", seconds_arg(duration_sec)]
+    cmd += [
+        "-map", "0:v:0",
+        "-map", "0:a:0?",
+        "-c", "copy",
+        "-movflags", "+faststart",
+        "-progress", "pipe:1",
+        "-nostats",
+        out_mp4,
+    ]
+    run_ffmpeg_with_progress(cmd, duration_sec_in, on_progress)
+
+
+def passthrough_source(input_path: str, start_sec: float | None = None) -> bool:
+    """
+    True if process_video can remux instead of encode: the source is already
+    in the output format (stream_copy_compatible) and a range starts on a
+    keyframe (a copy can only start on one).
+    """
+    if not PASSTHROUGH:
+        return False
+    info = probe_media(input_path)
+    if not stream_copy_compatible(info):
+        return False
+    if not start_sec or start_sec <= 0:
+        return True
+    if is_url(input_path):
+        return False
+    return is_keyframe(start_sec, probe_media(input_path, keyframes=True).keyframes)
+
+
+def process_video(
+    job_id: str,
+    input_path: str,
+    out_dir: str,
+    start_sec: float | None = None,
+    duration_sec: float | None = None,
+    report_progress: bool = True,
+    threads: int | None = None,
+    analysis_threads: int | None = None,
+):
+    os.makedirs(out_dir, exist_ok=True)
+    out_mp4 = os.path.join(out_dir, "vertical.mp4")
+
+    if passthrough_source(input_path, start_sec):
+        # Already vertical H.264/AAC: no face analysis, filter or encode, only the thumbnail
+        print(f"[Worker] Job {job_id}: Source already matches the output format, remuxing (passthrough)", flush=True)
+        if report_progress:
+            job_progress(job_id, 1, "encoding", "passthrough remux")
+        remux_vertical(
+            input_path,
+            out_mp4,
+            start_sec=start_sec,
+            duration_sec=duration_sec,
+            on_progress=(lambda pct: job_progress(job_id, pct, "encoding")) if report_progress else None,
+        )
+        if report_progress:
+            job_progress(job_id, 100, "encoding_done")
+        return finalize_outputs(job_id, out_dir, out_mp4)
+
+    # Smart crop analyzes exactly the range being encoded, seeking in the source
+    crop_result = get_smart_crop_result(
+        input_path, job_id, report_progress, start_sec=start_sec, duration_sec=duration_sec,
+        threads=analysis_threads,
+    )
+    video_filter = smart_crop_filter(crop_result, job_id)
+
+    if report_progress:
+        job_progress(job_id, 1, "encoding", "starting ffmpeg")
+    encode_vertical(
+        input_path,
+        out_mp4,
+        video_filter,
+        start_sec=start_sec,
+        duration_sec=duration_sec,
+        threads=threads,
+        on_progress=(lambda pct: job_progress(job_id, pct, "encoding")) if report_progress else None,
+    )
+    if report_progress:
+        job_progress(job_id, 100, "encoding_done")
+
+    return finalize_outputs(job_id, out_dir, out_mp4, crop_result)
+
+
+def seconds_value(sec: float) -> int | float:
+    """Episode time for plans and payloads: whole seconds stay ints, others keep ms."""
+    sec = round(float(sec), 3)
+    return int(sec) if sec.is_integer() else sec
+
+
+def snap_to_keyframe(sec: float, keyframes: list[float] | None, tolerance: float) -> float:
+    """The keyframe nearest to sec if one is within tolerance, else sec."""
+    if not keyframes or tolerance <= 0:
+        return sec
+    i = bisect.bisect_left(keyframes, sec)
+    nearest = min(keyframes[max(0, i - 1):i + 1], key=lambda k: abs(k - sec))
+    return nearest if abs(nearest - sec) <= tolerance else sec
+
+
+def is_keyframe(sec: float, keyframes: list[float] | None) -> bool:
+    """True if sec is one of the keyframe times (to the millisecond plans are rounded to)."""
+    if not keyframes:
+        return False
+    i = bisect.bisect_left(keyframes, sec - 0.001)
+    return i < len(keyframes) and keyframes[i] <= sec + 0.001
+
+
+def plan_episodes(
+    total_sec: float,
+    seg: int,
+    max_eps: int,
+    keyframes: list[float] | None = None,
+    tolerance: float = 0.0,
+) -> list[dict]:
+    """
+    Cut a source of total_sec into consecutive episodes of about seg seconds.
+    With the source's keyframe index, every cut moves to the nearest keyframe
+    within `tolerance` seconds, so episodes start on keyframes: seeks to them
+    decode nothing extra, and sources in the output format can be cut by
+    stream copy. Cuts are fractional seconds.
+    Returns [{"episodeNumber", "start", "duration"}, ...].
+    """
+    count = max(1, int((total_sec + seg - 1) // seg))
+    
+    print(f"[DEBUG] Segment length: {seg}s, Total duration: {total_sec}s, Episode count: {count}", flush=True)
+    
+    # Respect max episodes limit from job payload
+    if count > max_eps:
+        print(f"Limiting count {count} to max {max_eps}", flush=True)
+        count = max_eps
+
+    episodes = []
+    start = 0.0
+    for i in range(count):
+        if total_sec - start <= 0:
+            break
+        # Nominal cuts stay at multiples of seg, so snapping never accumulates drift
+        end = (i + 1) * seg
+        end = total_sec if end >= total_sec else snap_to_keyframe(end, keyframes, tolerance)
+        dur = round(end, 3) - start
+        # Avoid creating a near-empty trailing episode (common with slightly-over durations).
+        if dur < 15:
+            break
+        episodes.append({"episodeNumber": i + 1, "start": seconds_value(start), "duration": seconds_value(dur)})
+        start = round(end, 3)
+    return episodes
+
+
+def stream_copy_compatible(info) -> bool:
+    """
+    True if a probed source (media_probe.MediaInfo) already is what the encode
+    produces, within the passthrough bitrate limits, so it can be published
+    (or cut into episodes) without decoding or encoding.
+    """
+    video = info.video if info else None
+    if video is None or video.rotation:
+        return False
+    if (video.codec_name, video.pix_fmt, (video.width, video.height)) != ("h264", "yuv420p", OUTPUT_SIZE):
+        return False
+    audio = info.audio
+    if audio is not None and (audio.codec_name != "aac" or audio.bit_rate > PASSTHROUGH_MAX_AUDIO_KBPS * 1000):
+        return False
+    # Containers without per-stream bitrates (mkv): judge by the overall bitrate
+    video_bps = video.bit_rate or info.bit_rate
+    return 0 < video_bps <= PASSTHROUGH_MAX_VIDEO_KBPS * 1000
+
+
+def build_series_crop_filter(crop_results: list[dict | None], episodes: list[dict]) -> str:
+    """
+    Build one -vf chain for the whole series where the crop position switches
+    per episode (piecewise on the frame timestamp t).
+    In dynamic mode each episode follows its own keyframe path instead.
+    Episodes without a smart crop result use a center crop.
+    """
+    known = [r for r in crop_results if r and r.get("crop_width") and r.get("crop_x") is not None]
+    if not known:
+        return DEFAULT_VERTICAL_FILTER
+
+    crop_w = known[0]["crop_width"]
+    crop_h = known[0]["crop_height"]
+
+    # Flat sum of gated terms (no nested if() so ffmpeg's expression depth limit never applies)
+    x_terms, y_terms = [], []
+    for idx, (ep, result) in enumerate(zip(episodes, crop_results)):
+        start = ep["start"] if idx > 0 else None
+        end = episodes[idx + 1]["start"] if idx < len(episodes) - 1 else None
+        path = result.get("crop_path") if result and SMART_CROP_MODE == "dynamic" else None
+        if path and len(path) > 1:
+            # Paths are relative to the episode's own analysis, shift them to source time
+            x_terms += crop_path_terms(path, 1, offset=ep["start"], start=start, end=end)
+            y_terms += crop_path_terms(path, 2, offset=ep["start"], start=start, end=end)
+            continue
+        if result and result.get("crop_x") is not None:
+            x_val, y_val = str(int(result["crop_x"])), str(int(result["crop_y"]))
+        else:
+            x_val, y_val = "(iw-ow)/2", "(ih-oh)/2"
+        gates = []
+        if start is not None:
+            gates.append(f"gte(t,{start})")
+        if end is not None:
+            gates.append(f"lt(t,{end})")
+        gate = "*".join(gates) or "1"
+        x_terms.append(f"{x_val}*{gate}")
+        y_terms.append(f"{y_val}*{gate}")
+
+    return f"crop={crop_w}:{crop_h}:'{'+'.join(x_terms)}':'{'+'.join(y_terms)}',scale=1080:1920"
+
+
+def series_crop_results(
+    job_id: str,
+    input_path: str,
+    episodes: list[dict],
+    planned: list[dict] | None = None,
+    on_progress=None,
+    threads: int | None = None,
+) -> list[dict | None]:
+    """
+    Smart crop results for every episode from one analysis of the source:
+    each episode gets its slice of the global crop track, so there are no
+    per-episode segment copies, decodes or detector set-ups. Only the span
+    covered by the planned episodes (default: episodes) is analyzed; a
+    resumed split passes the whole plan, so it analyzes the same span as the
+    first attempt and reuses its cached analysis.
+    """
+    if not episodes:
+        return []
+    planned = planned or episodes
+    span_start = planned[0]["start"]
+    span = planned[-1]["start"] + planned[-1]["duration"] - span_start
+    result = get_smart_crop_result(
+        input_path, job_id, report_progress=False, on_progress=on_progress,
+        start_sec=span_start, duration_sec=span, threads=threads,
+    )
+    if result is None:
+        return [None] * len(episodes)
+    crop_results = []
+    for ep in episodes:
         try:
-            os.remove(temp_segment)
-        except Exception:
-            pass
+            crop_results.append(slice_smart_crop_result(result, ep["start"] - span_start, ep["duration"]))
+        except Exception as e:
+            print(f"[Worker] Job {job_id}: Smart crop slice failed for episode {ep['episodeNumber']} ({e})", flush=True)
+            crop_results.append(None)
+    return crop_results
 
-    return out_mp4, out_jpg, out_srt, out_json, duration_sec
+
+def split_single_pass(
+    job_id: str,
+    input_path: str,
+    workdir: str,
+    episodes: list[dict],
+    crop_results: list[dict | None],
+    upload_stage: Stage,
+    report,
+    budget: ResourceBudget,
+    stream_copy: bool = False,
+):
+    """
+    Decode the source once and write every episode with one ffmpeg run.
+
+    The segment muxer cuts the output at the episode boundaries (keyframes are
+    forced there), so both video and audio are encoded exactly once.
+    crop_results holds each episode's smart crop result (series_crop_results).
+    Each episode goes on to the thumbnail and upload stages as soon as the
+    muxer closes its file (-segment_list), while ffmpeg encodes the next ones.
+    Episodes must be contiguous but need not start at 0 (resumed jobs): the
+    encode then starts at the first episode.
+    With stream_copy (source already in the output format, every episode
+    starting on a source keyframe) the packets are remuxed as they are: no
+    filter, decode or encode.
+    Yields finished pipeline items ({"episode", "outputs", ...}) in episode order.
+    """
+    count = len(episodes)
+    workers = max(1, min(budget.thumbnail_workers, count))
+
+    items = [
+        {"episode": ep, "crop_result": result, "out_dir": os.path.join(workdir, f"out_{ep['episodeNumber']:03d}")}
+        for ep, result in zip(episodes, crop_results)
+    ]
+
+    # The encode starts at the first episode, so its timeline (t, cut points) starts there too
+    offset = episodes[0]["start"]
+    encode_episodes = [dict(ep, start=seconds_value(ep["start"] - offset)) for ep in episodes]
+
+    end_sec = seconds_value(encode_episodes[-1]["start"] + encode_episodes[-1]["duration"])
+    boundaries = ",".join(seconds_arg(ep["start"]) for ep in encode_episodes[1:])
+    seg_pattern = os.path.join(workdir, "series_%03d.mp4")
+    seg_list = os.path.join(workdir, "series_segments.txt")
+    if os.path.exists(seg_list):
+        os.remove(seg_list)  # left over from an earlier run
+
+    if stream_copy:
+        print(f"[Worker] Job {job_id}: Source is already {OUTPUT_SIZE[0]}x{OUTPUT_SIZE[1]} H.264, cutting by stream copy", flush=True)
+        cmd = ["ffmpeg", "-y"] + ffmpeg_input_args(input_path, offset) + ["-t", seconds_arg(end_sec)]
+        cmd += ["-map", "0:v:0", "-map", "0:a:0?", "-c", "copy"]
+    else:
+        video_filter = build_series_crop_filter(crop_results, encode_episodes)
+        if len(video_filter) > 500:
+            print(f"[Worker] Job {job_id}: Single-pass series filter: {len(video_filter)} chars", flush=True)
+        else:
+            print(f"[Worker] Job {job_id}: Single-pass series filter: {video_filter}", flush=True)
+
+        encoder = get_ffmpeg_encoder()
+        cmd = ["ffmpeg", "-y"]
+        if encoder == "h264_nvenc":
+            cmd += ["-hwaccel", "auto"] # Auto-detect hardware decoder
+        cmd += ffmpeg_input_args(input_path, offset) + ["-t", seconds_arg(end_sec)] + video_filter_args(video_filter, workdir)
+        cmd += encoder_args(encoder, budget.encode_threads())
+        if boundaries:
+            cmd += ["-force_key_frames", boundaries]
+        cmd += ["-c:a", "aac", "-b:a", "128k"]
+    cmd += [
+        "-f", "segment",
+        "-reset_timestamps", "1",
+        "-segment_format", "mp4",
+        "-segment_format_options", "movflags=+faststart",
+    ]
+    if boundaries:
+        # Encoder priming shifts output pts slightly below the forced keyframe times;
+        # the delta lets the muxer cut on those keyframes instead of the next GOP.
+        cmd += ["-segment_times", boundaries, "-segment_time_delta", "0.1"]
+    else:
+        # A single episode: keep the muxer from cutting at its default 2s interval
+        cmd += ["-segment_time", seconds_arg(end_sec + 60)]
+    # The muxer appends a segment's file name to the list once the file is complete
+    cmd += ["-segment_list", seg_list, "-segment_list_type", "flat"]
+    cmd += ["-progress", "pipe:1", "-nostats", seg_pattern]
+
+    stopped = threading.Event()  # set by run_pipeline when a stage fails
+
+    def finished_segments():
+        """Yield items while the encode runs, each once its segment file is complete."""
+        process = []
+        failure = []
+
+        def encode():
+            try:
+                run_ffmpeg_with_progress(
+                    cmd,
+                    end_sec,
+                    lambda pct: report(20 + int(pct * 0.6), "split_encoding"),
+                    on_start=process.append,
+                )
+            except Exception as e:
+                failure.append(e)
+
+        report(20, "split_encoding", "starting ffmpeg (single pass)")
+        encoder_thread = threading.Thread(target=encode, name=f"encode-{job_id}", daemon=True)
+        encoder_thread.start()
+        done = 0
+        try:
+            while done < count:
+                running = encoder_thread.is_alive()
+                try:
+                    with open(seg_list, "r", encoding="utf-8") as f:
+                        listed = f.read().count("\n")
+                except OSError:
+                    listed = 0
+                while done < min(listed, count):
+                    item = items[done]
+                    os.makedirs(item["out_dir"], exist_ok=True)
+                    item["out_mp4"] = os.path.join(item["out_dir"], "vertical.mp4")
+                    os.replace(os.path.join(workdir, f"series_{done:03d}.mp4"), item["out_mp4"])
+                    done += 1
+                    yield item
+                if not running or stopped.is_set():
+                    break
+                time.sleep(0.5)
+            if stopped.is_set():
+                return
+            encoder_thread.join()
+            if failure:
+                raise failure[0]
+            if done < count:
+                ep_no = items[done]["episode"]["episodeNumber"]
+                raise RuntimeError(f"single-pass encode produced no output for episode {ep_no}")
+        finally:
+            # Left early (a later stage failed): stop encoding episodes nobody will upload
+            if encoder_thread.is_alive() and process:
+                process[0].terminate()
+            encoder_thread.join()
+
+    def thumbnail(item):
+        item["outputs"] = finalize_outputs(job_id, item["out_dir"], item["out_mp4"], item["crop_result"])
+        return item
+
+    yield from run_pipeline(finished_segments(), [
+        Stage("thumbnail", thumbnail, workers),
+        upload_stage,
+    ], queue_size=workers + 1, stop=stopped)
+
+
+def split_per_episode(
+    job_id: str,
+    input_path: str,
+    workdir: str,
+    episodes: list[dict],
+    crop_results: list[dict | None],
+    upload_stage: Stage,
+    report,
+    budget: ResourceBudget,
+):
+    """
+    Split with one encode (and one decode of the source) per episode, as a
+    staged pipeline: encode -> thumbnail -> upload. crop_results holds each
+    episode's smart crop result (series_crop_results).
+    Up to budget.encode_workers episodes are encoded concurrently, each ffmpeg
+    getting an equal share of the budget's cores; the other stages overlap with
+    the encodes. Encode progress is reported in 20..100 (analysis used 1..20).
+    Yields finished pipeline items ({"episode", "outputs", ...}) in episode order.
+    """
+    count = len(episodes)
+    workers = max(1, min(budget.encode_workers, count))
+    threads = budget.encode_threads(workers)
+    print(f"[Worker] Job {job_id}: Encoding {count} episodes with {workers} worker(s)", flush=True)
+
+    def encode(item):
+        ep = item["episode"]
+        ep_no = ep["episodeNumber"]
+        index = episodes.index(ep)
+        stage = f"split_encoding_ep_{ep_no}/{count}"
+        report(20 + int((index / count) * 80), stage)
+        try:
+            print(f"[DEBUG] Processing episode {ep_no}: start={ep['start']}s, duration={ep['duration']}s", flush=True)
+            os.makedirs(item["out_dir"], exist_ok=True)
+            item["out_mp4"] = os.path.join(item["out_dir"], "vertical.mp4")
+            encode_vertical(
+                input_path, item["out_mp4"], smart_crop_filter(item["crop_result"], job_id),
+                start_sec=ep["start"], duration_sec=ep["duration"], threads=threads,
+                on_progress=lambda pct: report(20 + int(((index + pct / 100) / count) * 80), stage),
+            )
+        except Exception as e:
+            print(f"[ERROR] Failed to process episode {ep_no}: {e}", flush=True)
+            import traceback
+            traceback.print_exc()
+            raise
+        return item
+
+    def thumbnail(item):
+        item["outputs"] = finalize_outputs(job_id, item["out_dir"], item["out_mp4"], item["crop_result"])
+        print(f"[DEBUG] Episode {item['episode']['episodeNumber']} processed successfully", flush=True)
+        return item
+
+    items = [
+        {"episode": ep, "crop_result": result, "out_dir": os.path.join(workdir, f"out_{ep['episodeNumber']:03d}")}
+        for ep, result in zip(episodes, crop_results)
+    ]
+    yield from run_pipeline(items, [
+        Stage("encode", encode, workers),
+        Stage("thumbnail", thumbnail),
+        upload_stage,
+    ], queue_size=workers + 1)
 
 
 def upload_file(s3, bucket: str, key: str, path: str, content_type: str | None = None):
+    """
+    Upload through the managed transfer layer: files above the multipart threshold
+    are sent as parallel parts, each carrying a streaming checksum.
+    """
     extra = {}
     if content_type:
         extra["ContentType"] = content_type
-    with open(path, "rb") as f:
-        s3.put_object(Bucket=bucket, Key=key, Body=f, **extra)
+    if S3_CHECKSUM_ALGORITHM and S3_CHECKSUM_ALGORITHM != "NONE":
+        extra["ChecksumAlgorithm"] = S3_CHECKSUM_ALGORITHM
+    s3.upload_file(path, bucket, key, ExtraArgs=extra, Config=TRANSFER_CONFIG)
 
 
 def download_from_url(url: str, dest_path: str):
     # Check if it looks like a YouTube URL or similar that yt-dlp supports
-    is_supported_site = any(x in url for x in ["youtube.com", "youtu.be", "tiktok.com", "instagram.com"])
+    is_supported_site = is_ytdlp_url(url)
     
     if is_supported_site:
         print(f"[Worker] Downloading with yt-dlp: {url}", flush=True)
@@ -440,36 +1082,187 @@ def download_from_url(url: str, dest_path: str):
             all_files = os.listdir(download_subdir) if os.path.exists(download_subdir) else []
             raise RuntimeError(f"yt-dlp download completed but no video file found. Files in {download_subdir}: {all_files}")
     else:
-        print(f"[Worker] Downloading with requests: {url}", flush=True)
-        with requests.get(url, stream=True) as r:
-            r.raise_for_status()
-            with open(dest_path, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
+        print(f"[Worker] Downloading with ranged requests: {url}", flush=True)
+        download_ranged(url, dest_path)
 
 
-def split_series(job: dict):
+def is_ytdlp_url(url: str) -> bool:
+    """YouTube and similar sites have to go through yt-dlp (no direct media URL)."""
+    return any(x in url for x in ["youtube.com", "youtu.be", "tiktok.com", "instagram.com"])
+
+
+def ingest_source(s3, raw_key: str, input_path: str) -> str:
+    """
+    Make the raw video available for processing and return the path/URL to read.
+
+    In stream mode, ffmpeg and OpenCV read the object directly through a presigned
+    S3 URL (or the source URL), with ranged reads and no full-size scratch copy,
+    so probing and analysis start within seconds. yt-dlp sources, and sources
+    that cannot be probed remotely, fall back to a download.
+    """
+    if INGEST_MODE == "stream":
+        if raw_key.startswith("http"):
+            url = None if is_ytdlp_url(raw_key) else raw_key
+        else:
+            url = s3.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": S3_BUCKET_RAW, "Key": raw_key},
+                ExpiresIn=INGEST_URL_TTL_SEC,
+            )
+        if url and ffprobe_duration_sec(url):
+            print(f"[Worker] Streaming source without download: {raw_key}", flush=True)
+            return url
+        print(f"[Worker] Source not streamable, downloading instead: {raw_key}", flush=True)
+
+    if raw_key.startswith("http"):
+        download_from_url(raw_key, input_path)
+    else:
+        s3.download_file(S3_BUCKET_RAW, raw_key, input_path, Config=TRANSFER_CONFIG)
+    return input_path
+
+
+def split_manifest_key(job_id: str) -> str:
+    return f"manifests/{job_id}_split.json"
+
+
+def load_split_manifest(s3, workdir: str, job_id: str) -> dict | None:
+    """Checkpoint of a previous attempt: local scratch first, then the processed bucket."""
+    if SPLIT_CHECKPOINT not in ("local", "bucket"):
+        return None
+    try:
+        with open(os.path.join(workdir, "split_manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    if SPLIT_CHECKPOINT == "bucket":
+        try:
+            obj = s3.get_object(Bucket=S3_BUCKET_PROCESSED, Key=split_manifest_key(job_id))
+            return json.loads(obj["Body"].read())
+        except Exception:
+            pass
+    return None
+
+
+def save_split_manifest(s3, workdir: str, manifest: dict):
+    if SPLIT_CHECKPOINT not in ("local", "bucket"):
+        return
+    data = json.dumps(manifest, indent=2)
+    path = os.path.join(workdir, "split_manifest.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    if SPLIT_CHECKPOINT == "bucket":
+        try:
+            s3.put_object(
+                Bucket=S3_BUCKET_PROCESSED,
+                Key=split_manifest_key(manifest["jobId"]),
+                Body=data.encode("utf-8"),
+                ContentType="application/json",
+            )
+        except Exception as e:
+            print(f"[Worker] Job {manifest['jobId']}: Failed to store checkpoint in bucket: {e}", flush=True)
+
+
+def delete_split_manifest(s3, workdir: str, job_id: str):
+    try:
+        os.remove(os.path.join(workdir, "split_manifest.json"))
+    except OSError:
+        pass
+    if SPLIT_CHECKPOINT == "bucket":
+        try:
+            s3.delete_object(Bucket=S3_BUCKET_PROCESSED, Key=split_manifest_key(job_id))
+        except Exception:
+            pass
+
+
+def verify_uploaded_episode(s3, entry: dict) -> bool:
+    """True if every object of a checkpointed episode is still in the bucket (video at its recorded size)."""
+    try:
+        head = s3.head_object(Bucket=S3_BUCKET_PROCESSED, Key=entry["videoKey"])
+        if entry.get("videoBytes") and head.get("ContentLength") != entry["videoBytes"]:
+            return False
+        for key in ("thumbnailKey", "subtitlesKey", "metadataKey"):
+            s3.head_object(Bucket=S3_BUCKET_PROCESSED, Key=entry[key])
+        return True
+    except Exception:
+        return False
+
+
+def contiguous_runs(episodes: list[dict]) -> list[list[dict]]:
+    """Split episodes into runs without gaps (each run can be encoded in one pass)."""
+    runs = []
+    for ep in episodes:
+        # Planned times are rounded to the millisecond, their sums are not
+        if runs and abs(runs[-1][-1]["start"] + runs[-1][-1]["duration"] - ep["start"]) < 0.0005:
+            runs[-1].append(ep)
+        else:
+            runs.append([ep])
+    return runs
+
+
+def split_series(job: dict, budget: ResourceBudget | None = None):
+    budget = budget or default_budget()
     job_id = job["id"]
     raw_key = job.get("rawKey")
     seg = int(job.get("seriesEpisodeDurationSec") or 180)
 
-    stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     workdir = os.path.join(tempfile.gettempdir(), f"job_{job_id}")
     os.makedirs(workdir, exist_ok=True)
     input_path = os.path.join(workdir, "input.mp4")  # Use .mp4 extension for ffprobe
 
-    s3 = s3_client()
+    s3 = shared_s3_client()
 
     print("job_claimed_split:", job_id, "raw_key=", raw_key, "seg=", seg, flush=True)
-    job_progress(job_id, 0, "downloading")
-    if raw_key.startswith("http"):
-        download_from_url(raw_key, input_path)
+
+    seg = max(30, seg)
+    max_eps = int(job.get("seriesMaxEpisodes") or 50)
+
+    # Resume from the checkpoint of a previous attempt of this job, if it planned the same split
+    manifest = load_split_manifest(s3, workdir, job_id)
+    if manifest and (manifest.get("rawKey"), manifest.get("seg"), manifest.get("maxEps")) != (raw_key, seg, max_eps):
+        manifest = None
+    if manifest:
+        completed = {
+            int(ep_no): entry for ep_no, entry in manifest.get("completed", {}).items()
+            if verify_uploaded_episode(s3, entry)
+        }
+        print(f"[Worker] Job {job_id}: Resuming split, {len(completed)} episode(s) already uploaded", flush=True)
     else:
-        s3.download_file(S3_BUCKET_RAW, raw_key, input_path)
+        manifest = {
+            "jobId": job_id,
+            "rawKey": raw_key,
+            "seg": seg,
+            "maxEps": max_eps,
+            "stamp": datetime.utcnow().strftime("%Y%m%d_%H%M%S"),
+        }
+        completed = {}
+    manifest["completed"] = {str(ep_no): entry for ep_no, entry in completed.items()}
+    stamp = manifest["stamp"]
+
+    def complete(segments: dict):
+        payload = [
+            {k: v for k, v in segments[ep_no].items() if k != "videoBytes"}
+            for ep_no in sorted(segments)
+        ]
+        job_progress(job_id, 100, "uploaded")
+        job_complete(job_id, {"segments": payload})
+        delete_split_manifest(s3, workdir, job_id)
+        print("job_completed_split:", job_id, "episodes=", len(payload), flush=True)
+
+    episodes = manifest.get("episodes")
+    if episodes and all(ep["episodeNumber"] in completed for ep in episodes):
+        # Everything was uploaded before the previous attempt died: no download needed
+        complete(completed)
+        return
+
+    job_progress(job_id, 0, "downloading")
+    input_path = ingest_source(s3, raw_key, input_path)
     job_progress(job_id, 1, "downloaded")
 
     # Debug: Check file exists and its size
-    if os.path.exists(input_path):
+    if is_url(input_path):
+        print(f"[Worker] Job {job_id}: Input is streamed from the source URL (no local copy)", flush=True)
+    elif os.path.exists(input_path):
         file_size = os.path.getsize(input_path)
         print(f"[DEBUG] Input file exists: {input_path} ({file_size} bytes)", flush=True)
     else:
@@ -478,46 +1271,41 @@ def split_series(job: dict):
         print(f"[DEBUG] Files in {workdir}: {os.listdir(workdir)}", flush=True)
         raise RuntimeError(f"Downloaded file not found at {input_path}")
 
-    total_sec = ffprobe_duration_sec(input_path) or 1
-    print(f"[DEBUG] ffprobe_duration_sec result: {total_sec} seconds", flush=True)
-    
-    seg = max(30, seg)
-    count = max(1, int((total_sec + seg - 1) // seg))
-    
-    print(f"[DEBUG] Segment length: {seg}s, Total duration: {total_sec}s, Episode count: {count}", flush=True)
-    
-    # Respect max episodes limit from job payload
-    max_eps = int(job.get("seriesMaxEpisodes") or 50)
-    if count > max_eps:
-        print(f"Limiting count {count} to max {max_eps}", flush=True)
-        count = max_eps
+    # The keyframe index is a demux pass over the whole file: only for local copies
+    info = probe_media(input_path, keyframes=SPLIT_KEYFRAME_TOLERANCE_SEC > 0 and not is_url(input_path))
+    keyframes = info.keyframes if info else None
+    if not episodes:
+        total_sec = info.duration if info and info.duration > 0 else 1
+        print(f"[DEBUG] Probed duration: {total_sec} seconds, {len(keyframes or [])} keyframes", flush=True)
+        episodes = plan_episodes(total_sec, seg, max_eps, keyframes, SPLIT_KEYFRAME_TOLERANCE_SEC)
+        manifest["episodes"] = episodes
+        save_split_manifest(s3, workdir, manifest)
+    count = len(episodes)
+    pending = [ep for ep in episodes if ep["episodeNumber"] not in completed]
+
+    # Already vertical H.264 with every cut on a keyframe: remux instead of re-encoding
+    stream_copy = (
+        SPLIT_STREAM_COPY
+        and stream_copy_compatible(info)
+        and all(is_keyframe(ep["start"], keyframes) for ep in pending)
+    )
+    manifest_lock = threading.Lock()
 
-    segments_payload = []
-    for i in range(count):
-        ep_no = i + 1
-        start = i * seg
-        remaining = total_sec - start
-        if remaining <= 0:
-            break
-        dur = min(seg, remaining)
-        # Avoid creating a near-empty trailing episode (common with slightly-over durations).
-        if dur < 15:
-            break
+    # Stages run on several threads; only ever move the job's progress forward.
+    # A lower report still goes out (with the current percentage): every report
+    # is a heartbeat, and the server requeues jobs that stay silent.
+    progress_lock = threading.Lock()
+    last_progress = [0]
 
-        out_dir = os.path.join(workdir, f"out_{ep_no:03d}")
-        job_progress(job_id, max(1, int((i / count) * 100)), f"split_encoding_ep_{ep_no}/{count}")
+    def report(pct: int, stage: str, message: str | None = None):
+        with progress_lock:
+            pct = last_progress[0] = max(pct, last_progress[0])
+        job_progress(job_id, pct, stage, message)
 
-        try:
-            print(f"[DEBUG] Processing episode {ep_no}: start={start}s, duration={dur}s", flush=True)
-            out_mp4, out_jpg, out_srt, out_json, duration_sec = process_video(
-                job_id, input_path, out_dir, start_sec=start, duration_sec=dur, report_progress=False
-            )
-            print(f"[DEBUG] Episode {ep_no} processed successfully", flush=True)
-        except Exception as e:
-            print(f"[ERROR] Failed to process episode {ep_no}: {e}", flush=True)
-            import traceback
-            traceback.print_exc()
-            raise
+    def upload(item):
+        ep = item["episode"]
+        ep_no = ep["episodeNumber"]
+        out_mp4, out_jpg, out_srt, out_json, duration_sec = item["outputs"]
 
         base_key = f"processed/{job_id}_{stamp}_ep{ep_no:03d}"
         video_key = f"{base_key}.mp4"
@@ -530,28 +1318,201 @@ def split_series(job: dict):
         upload_file(s3, S3_BUCKET_PROCESSED, subs_key, out_srt, "application/x-subrip")
         upload_file(s3, S3_BUCKET_PROCESSED, meta_key, out_json, "application/json")
 
-        segments_payload.append(
+        item["segment"] = {
+            "episodeNumber": ep_no,
+            "videoKey": video_key,
+            "thumbnailKey": thumb_key,
+            "subtitlesKey": subs_key,
+            "metadataKey": meta_key,
+            "durationSec": int(duration_sec or ep["duration"] or seg),
+        }
+
+        # Checkpoint: a retry of this job reuses the episode instead of redoing it
+        with manifest_lock:
+            completed[ep_no] = dict(item["segment"], videoBytes=os.path.getsize(out_mp4))
+            manifest["completed"][str(ep_no)] = completed[ep_no]
+            save_split_manifest(s3, workdir, manifest)
+        return item
+
+    def analysis_progress(pct: int):
+        if pct % 5 == 0:
+            report(max(1, pct // 5), "split_analyzing")
+
+    # One smart crop analysis of the source, sliced per episode (nothing to crop when copying)
+    crop_results = {ep["episodeNumber"]: None for ep in pending}
+    if not stream_copy:
+        report(1, "split_analyzing")
+        crop_results = dict(zip(
+            (ep["episodeNumber"] for ep in pending),
+            series_crop_results(
+                job_id, input_path, pending, episodes,
+                on_progress=analysis_progress, threads=budget.analysis_threads(),
+            ),
+        ))
+
+    upload_stage = Stage("upload", upload, budget.upload_workers)
+    if SPLIT_MODE == "per_episode" and not stream_copy:
+        results = split_per_episode(
+            job_id, input_path, workdir, pending, [crop_results[ep["episodeNumber"]] for ep in pending],
+            upload_stage, report, budget,
+        )
+    else:
+        # One decode per run of consecutive missing episodes
+        results = itertools.chain.from_iterable(
+            split_single_pass(
+                job_id, input_path, workdir, run, [crop_results[ep["episodeNumber"]] for ep in run],
+                upload_stage, report, budget, stream_copy=stream_copy,
+            )
+            for run in contiguous_runs(pending)
+        )
+
+    # Analysis reports up to 20%; encodes and uploads interleave over 20..100
+    for item in results:
+        pct = 20 + (len(completed) / count) * 80
+        report(int(min(99, pct)), f"split_uploaded_ep_{item['episode']['episodeNumber']}/{count}")
+
+    complete(completed)
+
+
+def handle_job(job: dict, s3, budget: ResourceBudget | None = None):
+    budget = budget or default_budget()
+    job_id = job["id"]
+    raw_key = job.get("rawKey")
+    kind = job.get("kind") or "ENCODE_ONE"
+    if not raw_key:
+        job_fail(job_id, "Missing rawKey on job")
+        return
+
+    if kind == "SPLIT_SERIES":
+        try:
+            split_series(job, budget)
+        except Exception as e:
+            print("job_failed_split:", job_id, e, flush=True)
+            try:
+                job_progress(job_id, 0, "failed", str(e))
+                job_fail(job_id, str(e))
+            except Exception as e2:
+                print("job_fail_callback_error:", e2, flush=True)
+        return
+
+    stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    workdir = os.path.join(tempfile.gettempdir(), f"job_{job_id}")
+    os.makedirs(workdir, exist_ok=True)
+    input_path = os.path.join(workdir, "input.mp4")  # Use .mp4 extension for ffprobe
+
+    try:
+        # Download raw video
+        print("job_claimed:", job_id, "raw_key=", raw_key, flush=True)
+        job_progress(job_id, 0, "downloading")
+        input_path = ingest_source(s3, raw_key, input_path)
+        job_progress(job_id, 1, "downloaded")
+
+        out_mp4, out_jpg, out_srt, out_json, duration_sec = process_video(
+            job_id, input_path, os.path.join(workdir, "out"),
+            threads=budget.encode_threads(), analysis_threads=budget.analysis_threads(),
+        )
+
+        base = f"processed/{job_id}_{stamp}"
+        video_key = f"{base}.mp4"
+        thumb_key = f"{base}.jpg"
+        subs_key = f"{base}.srt"
+        meta_key = f"{base}.json"
+
+        upload_file(s3, S3_BUCKET_PROCESSED, video_key, out_mp4, "video/mp4")
+        upload_file(s3, S3_BUCKET_PROCESSED, thumb_key, out_jpg, "image/jpeg")
+        upload_file(s3, S3_BUCKET_PROCESSED, subs_key, out_srt, "application/x-subrip")
+        upload_file(s3, S3_BUCKET_PROCESSED, meta_key, out_json, "application/json")
+
+        job_progress(job_id, 100, "uploaded")
+        job_complete(
+            job_id,
             {
-                "episodeNumber": ep_no,
                 "videoKey": video_key,
                 "thumbnailKey": thumb_key,
                 "subtitlesKey": subs_key,
                 "metadataKey": meta_key,
-                "durationSec": int(duration_sec or dur or seg),
-            }
+                "durationSec": duration_sec or 1,
+            },
         )
+        print("job_completed:", job_id, flush=True)
+    except Exception as e:
+        print("job_failed:", job_id, e, flush=True)
+        try:
+            job_progress(job_id, 0, "failed", str(e))
+            job_fail(job_id, str(e))
+        except Exception as e2:
+            print("job_fail_callback_error:", e2, flush=True)
+
+
+def run_slot(slot: int, s3, governor: ResourceGovernor):
+    """Claim-and-run loop for one job slot; claims only when the governor grants headroom."""
+    while True:
+        budget = governor.try_acquire()
+        if budget is None:
+            time.sleep(2)
+            continue
 
-        job_progress(job_id, int(min(99, ((i + 1) / count) * 100)), f"split_uploaded_ep_{ep_no}/{count}")
+        try:
+            try:
+                job = claim_job()
+            except Exception as e:
+                print(f"[Worker] Slot {slot}: claim_job_error:", e, flush=True)
+                time.sleep(3)
+                continue
+
+            if not job:
+                time.sleep(2)
+                continue
 
-    job_progress(job_id, 100, "uploaded")
-    job_complete(job_id, {"segments": segments_payload})
-    print("job_completed_split:", job_id, "episodes=", len(segments_payload), flush=True)
+            print(f"[Worker] Slot {slot}: running job {job['id']}", flush=True)
+            handle_job(job, s3, budget)
+        finally:
+            governor.release()
 
 
 def main():
     if not WORKER_TOKEN:
         raise RuntimeError("WORKER_TOKEN is required")
-    s3 = s3_client()
+    s3 = shared_s3_client()
+
+    if SMART_CROP_AVAILABLE:
+        # Face detectors are shared process-wide; build and warm them before the first job
+        preload_models()
+
+    governor = None
+    if WORKER_SLOTS > 1:
+        governor = ResourceGovernor(
+            WORKER_SLOTS,
+            encode_workers=SPLIT_WORKERS,
+            upload_workers=UPLOAD_WORKERS,
+            min_free_memory_mb=WORKER_MIN_FREE_MEMORY_MB,
+            max_load_per_core=WORKER_MAX_LOAD_PER_CORE,
+        )
+        print(f"[Worker] Multi-slot mode: {governor.describe()}", flush=True)
+
+    if get_ffmpeg_encoder() == "h264_nvenc":
+        print("[Worker] NVIDIA GPU acceleration (NVENC) detected! Using GPU for encoding.", flush=True)
+    else:
+        print("[Worker] GPU acceleration not detected. Using CPU (libx264) for encoding.", flush=True)
+        # Calibrate under the load this worker's encodes run with: one encode per slot,
+        # or encode_workers concurrent episodes per slot, every slot busy
+        budget = governor.budget if governor else default_budget()
+        slots = governor.slots if governor else 1
+        calibrate_encoder(FFMPEG_PATH, [
+            (budget.encode_threads(), slots),
+            (budget.encode_threads(budget.encode_workers), slots * budget.encode_workers),
+        ])
+
+    if governor:
+        slots = [
+            threading.Thread(target=run_slot, args=(i + 1, s3, governor), name=f"slot-{i + 1}", daemon=True)
+            for i in range(WORKER_SLOTS)
+        ]
+        for t in slots:
+            t.start()
+        for t in slots:
+            t.join()
+        return
 
     while True:
         job = None
@@ -566,72 +1527,7 @@ def main():
             time.sleep(2)
             continue
 
-        job_id = job["id"]
-        raw_key = job.get("rawKey")
-        kind = job.get("kind") or "ENCODE_ONE"
-        if not raw_key:
-            job_fail(job_id, "Missing rawKey on job")
-            continue
-
-        if kind == "SPLIT_SERIES":
-            try:
-                split_series(job)
-            except Exception as e:
-                print("job_failed_split:", job_id, e, flush=True)
-                try:
-                    job_progress(job_id, 0, "failed", str(e))
-                    job_fail(job_id, str(e))
-                except Exception as e2:
-                    print("job_fail_callback_error:", e2, flush=True)
-            continue
-
-        stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        workdir = os.path.join(tempfile.gettempdir(), f"job_{job_id}")
-        os.makedirs(workdir, exist_ok=True)
-        input_path = os.path.join(workdir, "input.mp4")  # Use .mp4 extension for ffprobe
-
-        try:
-            # Download raw video
-            print("job_claimed:", job_id, "raw_key=", raw_key, flush=True)
-            job_progress(job_id, 0, "downloading")
-            if raw_key.startswith("http"):
-                download_from_url(raw_key, input_path)
-            else:
-                s3.download_file(S3_BUCKET_RAW, raw_key, input_path)
-            job_progress(job_id, 1, "downloaded")
-
-            out_mp4, out_jpg, out_srt, out_json, duration_sec = process_video(job_id, input_path, os.path.join(workdir, "out"))
-
-            base = f"processed/{job_id}_{stamp}"
-            video_key = f"{base}.mp4"
-            thumb_key = f"{base}.jpg"
-            subs_key = f"{base}.srt"
-            meta_key = f"{base}.json"
-
-            upload_file(s3, S3_BUCKET_PROCESSED, video_key, out_mp4, "video/mp4")
-            upload_file(s3, S3_BUCKET_PROCESSED, thumb_key, out_jpg, "image/jpeg")
-            upload_file(s3, S3_BUCKET_PROCESSED, subs_key, out_srt, "application/x-subrip")
-            upload_file(s3, S3_BUCKET_PROCESSED, meta_key, out_json, "application/json")
-
-            job_progress(job_id, 100, "uploaded")
-            job_complete(
-                job_id,
-                {
-                    "videoKey": video_key,
-                    "thumbnailKey": thumb_key,
-                    "subtitlesKey": subs_key,
-                    "metadataKey": meta_key,
-                    "durationSec": duration_sec or 1,
-                },
-            )
-            print("job_completed:", job_id, flush=True)
-        except Exception as e:
-            print("job_failed:", job_id, e, flush=True)
-            try:
-                job_progress(job_id, 0, "failed", str(e))
-                job_fail(job_id, str(e))
-            except Exception as e2:
-                print("job_fail_callback_error:", e2, flush=True)
+        handle_job(job, s3)
 
 
 if __name__ == "__main__":
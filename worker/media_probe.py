@@ -0,0 +1,320 @@
+"""
+Media Probe for ShortDrama Worker
+
+Every stage needs to know what it is reading: the split planner and encoders
+need the duration, frame sources the fps, size and rotation, split planning
+the keyframes. probe_media() answers all of it with one ffprobe run
+(`-print_format json -show_format -show_streams`) and memoizes the result
+per (path, size, mtime), so later stages reading the same file pay nothing.
+
+The keyframe index needs a pass over the video packets (demux only, no
+decode) and is only built when asked for, then kept with the rest.
+
+Where ffprobe is missing (some Windows setups) the same information is
+parsed from `ffmpeg -i`, and keyframes are listed by decoding keyframes only.
+"""
+
+import json
+import os
+import re
+import subprocess
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+FFPROBE_PATH = os.environ.get("FFPROBE_PATH", "ffprobe")
+FFMPEG_PATH = "ffmpeg"  # Default: use PATH; the worker sets its resolved path (set_ffmpeg_path)
+
+PROBE_TIMEOUT_SEC = 30
+KEYFRAME_TIMEOUT_SEC = 600
+MEMO_ENTRIES = 128
+
+
+@dataclass
+class StreamInfo:
+    """One stream of a media file (fields not applicable to its type stay 0/empty)."""
+    index: int
+    codec_type: str  # video, audio, subtitle, data
+    codec_name: str
+    profile: str = ""
+    pix_fmt: str = ""
+    width: int = 0  # coded size; see display_size
+    height: int = 0
+    fps: float = 0.0
+    frame_count: int = 0
+    rotation: int = 0  # clockwise degrees players rotate the picture by
+    bit_rate: int = 0
+    sample_rate: int = 0
+    channels: int = 0
+    attached_pic: bool = False  # cover art, not a real video stream
+
+    @property
+    def display_size(self) -> Tuple[int, int]:
+        """(width, height) as decoded by ffmpeg/OpenCV, which apply the rotation."""
+        if self.rotation % 180 == 90:
+            return self.height, self.width
+        return self.width, self.height
+
+
+@dataclass
+class MediaInfo:
+    path: str
+    duration: float
+    start_time: float = 0.0  # container start timestamp; -ss and keyframe times count from it
+    format_name: str = ""
+    bit_rate: int = 0
+    size_bytes: int = 0
+    streams: List[StreamInfo] = field(default_factory=list)
+    keyframes: Optional[List[float]] = None  # video keyframe times (seconds from start_time), once indexed
+
+    @property
+    def video(self) -> Optional[StreamInfo]:
+        return next((s for s in self.streams if s.codec_type == "video" and not s.attached_pic), None)
+
+    @property
+    def audio(self) -> Optional[StreamInfo]:
+        return next((s for s in self.streams if s.codec_type == "audio"), None)
+
+
+def set_ffmpeg_path(path: str):
+    """
+    Use the worker's ffmpeg binary for the fallback probes and frame sources.
+    Without FFPROBE_PATH, an ffprobe next to that binary is preferred too.
+    """
+    global FFMPEG_PATH, FFPROBE_PATH
+    FFMPEG_PATH = path
+    if "FFPROBE_PATH" not in os.environ and os.path.dirname(path):
+        name = os.path.basename(path).replace("ffmpeg", "ffprobe")
+        candidate = os.path.join(os.path.dirname(path), name)
+        if name != os.path.basename(path) and os.path.exists(candidate):
+            FFPROBE_PATH = candidate
+
+
+def ffmpeg_path() -> str:
+    return FFMPEG_PATH
+
+
+_memo: "OrderedDict[tuple, MediaInfo]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _memo_key(path: str) -> Optional[tuple]:
+    if path.startswith(("http://", "https://")):
+        return (path,)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+def _parse_rate(rate: str) -> float:
+    try:
+        num, _, den = (rate or "0").partition("/")
+        return float(num) / float(den or 1) if float(den or 1) else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _int(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _ffprobe(path: str) -> Optional[MediaInfo]:
+    result = subprocess.run(
+        [FFPROBE_PATH, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+        capture_output=True,
+        text=True,
+        timeout=PROBE_TIMEOUT_SEC,
+    )
+    if result.returncode != 0:
+        return None
+    data = json.loads(result.stdout or "{}")
+    fmt = data.get("format", {})
+
+    streams = []
+    for s in data.get("streams", []):
+        rotation = 0
+        if "rotate" in s.get("tags", {}):
+            rotation = _int(s["tags"]["rotate"]) % 360
+        for side in s.get("side_data_list", []):
+            if "rotation" in side:
+                # Display matrix rotation is counter-clockwise
+                rotation = -_int(side["rotation"]) % 360
+        fps = _parse_rate(s.get("avg_frame_rate")) or _parse_rate(s.get("r_frame_rate"))
+        frame_count = _int(s.get("nb_frames"))
+        if not frame_count and s.get("codec_type") == "video":
+            frame_count = int(round(float(s.get("duration") or fmt.get("duration") or 0) * fps))
+        streams.append(StreamInfo(
+            index=_int(s.get("index")),
+            codec_type=s.get("codec_type", ""),
+            codec_name=s.get("codec_name", ""),
+            profile=s.get("profile", ""),
+            pix_fmt=s.get("pix_fmt", ""),
+            width=_int(s.get("width")),
+            height=_int(s.get("height")),
+            fps=fps if s.get("codec_type") == "video" else 0.0,
+            frame_count=frame_count if s.get("codec_type") == "video" else 0,
+            rotation=rotation,
+            bit_rate=_int(s.get("bit_rate")),
+            sample_rate=_int(s.get("sample_rate")),
+            channels=_int(s.get("channels")),
+            attached_pic=bool(s.get("disposition", {}).get("attached_pic")),
+        ))
+
+    duration = float(fmt.get("duration") or 0) or max(
+        (float(s.get("duration") or 0) for s in data.get("streams", [])), default=0.0
+    )
+    return MediaInfo(
+        path=path,
+        duration=duration,
+        start_time=float(fmt.get("start_time") or 0),
+        format_name=fmt.get("format_name", ""),
+        bit_rate=_int(fmt.get("bit_rate")),
+        size_bytes=_int(fmt.get("size")),
+        streams=streams,
+    )
+
+
+_STREAM_RE = re.compile(r"Stream #\d+:(\d+)\S*: (Video|Audio|Subtitle|Data): (\w+)(?: \(([^)]*)\))?(.*)")
+_CHANNELS = {"mono": 1, "stereo": 2, "2.1": 3, "quad": 4, "5.0": 5, "5.1": 6, "6.1": 7, "7.1": 8}
+
+
+def _ffmpeg_info(path: str) -> Optional[MediaInfo]:
+    """Fallback: the same information from `ffmpeg -i` (stderr)."""
+    output = subprocess.run(
+        [FFMPEG_PATH, "-hide_banner", "-i", path], capture_output=True, text=True, timeout=PROBE_TIMEOUT_SEC
+    ).stderr
+
+    duration_match = re.search(r"Duration:\s*(\d+):(\d+):(\d+\.\d+)", output)
+    if not duration_match:
+        return None
+    h, m, sec = duration_match.groups()
+    duration = int(h) * 3600 + int(m) * 60 + float(sec)
+    bitrate_match = re.search(r"Duration:.*bitrate: (\d+) kb/s", output)
+    start_match = re.search(r"Duration:.*start: (-?[\d.]+)", output)
+    format_match = re.search(r"Input #\d+, (.+?), from", output)
+
+    streams: List[StreamInfo] = []
+    for line in output.splitlines():
+        stream_match = _STREAM_RE.search(line)
+        if stream_match:
+            index, kind, codec, profile, rest = stream_match.groups()
+            s = StreamInfo(index=int(index), codec_type=kind.lower(), codec_name=codec)
+            s.profile = profile if profile and "/" not in profile else ""
+            s.attached_pic = "(attached pic)" in rest
+            size = re.search(r", (\d{2,5})x(\d{2,5})", rest)
+            if size:
+                s.width, s.height = int(size.group(1)), int(size.group(2))
+            pix_fmt = re.match(r"[^,]*, (\w+)", rest)
+            if kind == "Video" and pix_fmt:
+                s.pix_fmt = pix_fmt.group(1)
+            fps = re.search(r"([\d.]+) fps", rest)
+            if kind == "Video" and fps:
+                s.fps = float(fps.group(1))
+                s.frame_count = int(round(duration * s.fps))
+            kbps = re.search(r"(\d+) kb/s", rest)
+            if kbps:
+                s.bit_rate = int(kbps.group(1)) * 1000
+            hz = re.search(r"(\d+) Hz, ([\w.]+)", rest)
+            if hz:
+                s.sample_rate = int(hz.group(1))
+                s.channels = _CHANNELS.get(hz.group(2), 0)
+            streams.append(s)
+            continue
+        rotation = re.search(r"rotation of (-?[\d.]+) degrees", line)
+        if rotation and streams:
+            streams[-1].rotation = -int(float(rotation.group(1))) % 360
+
+    size_bytes = 0
+    if not path.startswith(("http://", "https://")):
+        try:
+            size_bytes = os.path.getsize(path)
+        except OSError:
+            pass
+    return MediaInfo(
+        path=path,
+        duration=duration,
+        start_time=float(start_match.group(1)) if start_match else 0.0,
+        format_name=format_match.group(1) if format_match else "",
+        bit_rate=int(bitrate_match.group(1)) * 1000 if bitrate_match else 0,
+        size_bytes=size_bytes,
+        streams=streams,
+    )
+
+
+def _keyframe_index(path: str, start_time: float = 0.0) -> List[float]:
+    """Times of the first video stream's keyframes relative to start_time, ascending."""
+    try:
+        result = subprocess.run(
+            [
+                FFPROBE_PATH, "-v", "error", "-select_streams", "v:0",
+                "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path,
+            ],
+            capture_output=True,
+            text=True,
+            timeout=KEYFRAME_TIMEOUT_SEC,
+        )
+        lines = result.stdout.splitlines() if result.returncode == 0 else None
+        keyframes = [
+            float(pts) for pts, _, flags in (line.partition(",") for line in lines or [])
+            if "K" in flags and pts not in ("", "N/A")
+        ]
+    except FileNotFoundError:
+        # No ffprobe: decode keyframes only and read their timestamps from showinfo
+        result = subprocess.run(
+            [
+                FFMPEG_PATH, "-hide_banner", "-skip_frame", "nokey", "-i", path,
+                "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-",
+            ],
+            capture_output=True,
+            text=True,
+            timeout=KEYFRAME_TIMEOUT_SEC,
+        )
+        # ffmpeg already rebases input timestamps to the container start
+        keyframes = [float(t) for t in re.findall(r"pts_time:\s*(-?[\d.]+)", result.stderr)]
+        start_time = 0.0
+    return sorted({round(t - start_time, 6) for t in keyframes})
+
+
+def probe_media(path: str, keyframes: bool = False) -> Optional[MediaInfo]:
+    """
+    Format, streams and duration of a local file or URL; None if it cannot be
+    read. With keyframes=True the keyframe index is filled in as well.
+    Results are shared: treat them as read-only.
+    """
+    key = _memo_key(path)
+    info = None
+    if key is not None:
+        with _memo_lock:
+            info = _memo.get(key)
+            if info is not None:
+                _memo.move_to_end(key)
+
+    if info is None:
+        try:
+            try:
+                info = _ffprobe(path)
+            except FileNotFoundError:
+                info = _ffmpeg_info(path)
+        except (subprocess.TimeoutExpired, OSError, ValueError) as e:
+            print(f"[MediaProbe] Probe failed for {path}: {e}", flush=True)
+            return None
+        if info is None:
+            return None
+        if key is not None:
+            with _memo_lock:
+                _memo[key] = info
+                while len(_memo) > MEMO_ENTRIES:
+                    _memo.popitem(last=False)
+
+    if keyframes and info.keyframes is None and info.video is not None:
+        try:
+            info.keyframes = _keyframe_index(path, info.start_time)
+        except (subprocess.TimeoutExpired, OSError) as e:
+            print(f"[MediaProbe] Keyframe index failed for {path}: {e}", flush=True)
+    return info
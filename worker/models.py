@@ -0,0 +1,103 @@
+"""
+Model Registry for ShortDrama Worker
+
+Building a MediaPipe face detector loads its graph and TFLite model, which
+costs far more than running it on a frame. Detectors are therefore built
+once per process and shared: smart crop and smart thumbnails lease an
+instance from a pool, use it, and hand it back.
+
+A MediaPipe graph must not run on two threads at once, so a pool holds one
+instance per concurrent user and grows when every instance is leased. The
+worker preloads (and warms up) instances at startup so the first job does
+not pay for them.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import mediapipe as mp
+    MEDIAPIPE_AVAILABLE = True
+except ImportError:
+    MEDIAPIPE_AVAILABLE = False
+
+# Face detectors built and warmed up per pool at worker startup (0 = build on first use)
+MODEL_PRELOAD = int(os.environ.get("MODEL_PRELOAD") or 1)
+
+
+class FaceDetectorPool:
+    """Thread-safe pool of MediaPipe FaceDetection instances with one configuration."""
+
+    def __init__(self, model_selection: int = 1, min_detection_confidence: float = 0.5):
+        self.model_selection = model_selection
+        self.min_detection_confidence = min_detection_confidence
+        self._idle: List = []
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create(self):
+        detector = mp.solutions.face_detection.FaceDetection(
+            model_selection=self.model_selection,
+            min_detection_confidence=self.min_detection_confidence,
+        )
+        # Warm-up: the first process() call initializes the interpreter
+        detector.process(np.zeros((192, 192, 3), dtype=np.uint8))
+        with self._lock:
+            self._created += 1
+        return detector
+
+    def acquire(self):
+        """An idle detector, or a new one when all are leased."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._create()
+
+    def release(self, detector):
+        with self._lock:
+            self._idle.append(detector)
+
+    @contextmanager
+    def lease(self):
+        detector = self.acquire()
+        try:
+            yield detector
+        finally:
+            self.release(detector)
+
+    def warm(self, count: int):
+        """Build idle instances until the pool has at least count."""
+        while self._created < count:
+            self.release(self._create())
+
+    @property
+    def size(self) -> int:
+        return self._created
+
+
+_face_detector_pools: Dict[Tuple[int, float], FaceDetectorPool] = {}
+_pools_lock = threading.Lock()
+
+
+def face_detectors(model_selection: int = 1, min_detection_confidence: float = 0.5) -> FaceDetectorPool:
+    """Process-wide detector pool for a configuration."""
+    key = (model_selection, float(min_detection_confidence))
+    with _pools_lock:
+        pool = _face_detector_pools.get(key)
+        if pool is None:
+            pool = _face_detector_pools[key] = FaceDetectorPool(model_selection, min_detection_confidence)
+        return pool
+
+
+def preload_models(count: Optional[int] = None):
+    """Build and warm up `count` (default MODEL_PRELOAD) face detectors."""
+    count = MODEL_PRELOAD if count is None else count
+    if not MEDIAPIPE_AVAILABLE or count <= 0:
+        return
+    pool = face_detectors()
+    pool.warm(count)
+    print(f"[Models] Preloaded {pool.size} face detector(s)", flush=True)
@@ -0,0 +1,144 @@
+"""
+Staged pipeline for the ShortDrama worker.
+
+Items (episodes) flow through a list of stages connected by bounded queues,
+so different stages work on different items at the same time:
+
+    extract -> analyze -> encode -> thumbnail -> upload
+
+While episode N is uploading, episode N+1 is encoding and episode N+2 is being
+analyzed. Wall-clock time approaches the cost of the slowest stage instead of
+the sum of all stages. The bounded queues keep fast stages from running far
+ahead (and filling the scratch disk) when a later stage is the bottleneck.
+"""
+
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+
+@dataclass
+class Stage:
+    """One pipeline stage: fn(item) -> item, run by `workers` threads."""
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+
+
+_DONE = object()
+
+
+def run_pipeline(
+    items: Iterable[Any],
+    stages: List[Stage],
+    queue_size: int = 2,
+    stop: Optional[threading.Event] = None,
+) -> Iterator[Any]:
+    """
+    Push items through the stages and yield the final results in input order.
+
+    `items` is consumed lazily on a feeder thread, so it may be a generator
+    that produces items while the stages already work on earlier ones (e.g.
+    segments an encode is still writing). An exception from it, or the first
+    exception raised by any stage, stops the pipeline: items still queued are
+    dropped, work already running is allowed to finish, and the exception is
+    re-raised to the caller. `stop` (optional) is set when that happens, so a
+    lazy item source can watch it and quit producing.
+    """
+    if not stages:
+        yield from items
+        return
+
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+    results: queue.Queue = queue.Queue()
+    stop = stop or threading.Event()
+    errors: List[BaseException] = []
+    lock = threading.Lock()
+    remaining = [max(1, s.workers) for s in stages]
+
+    def feed():
+        source = iter(items)
+        try:
+            for idx, item in enumerate(source):
+                if stop.is_set():
+                    break
+                queues[0].put((idx, item))
+        except BaseException as e:
+            with lock:
+                errors.append(e)
+            stop.set()
+        finally:
+            if hasattr(source, "close"):
+                source.close()  # a generator left early cleans up now
+        for _ in range(remaining[0]):
+            queues[0].put(_DONE)
+
+    def work(stage_idx: int):
+        stage = stages[stage_idx]
+        inq = queues[stage_idx]
+        is_last = stage_idx == len(stages) - 1
+        while True:
+            entry = inq.get()
+            if entry is _DONE:
+                break
+            if stop.is_set():
+                continue  # drain so upstream never blocks
+            idx, item = entry
+            try:
+                out = stage.fn(item)
+            except BaseException as e:
+                with lock:
+                    errors.append(e)
+                stop.set()
+                continue
+            if is_last:
+                results.put((idx, out))
+            else:
+                queues[stage_idx + 1].put((idx, out))
+
+        # Last worker of this stage closes the next one
+        with lock:
+            remaining[stage_idx] -= 1
+            last_worker = remaining[stage_idx] == 0
+        if last_worker:
+            if is_last:
+                results.put(_DONE)
+            else:
+                for _ in range(remaining[stage_idx + 1]):
+                    queues[stage_idx + 1].put(_DONE)
+
+    threads = [threading.Thread(target=feed, name="pipeline-feed", daemon=True)]
+    for stage_idx, stage in enumerate(stages):
+        for n in range(max(1, stage.workers)):
+            threads.append(threading.Thread(
+                target=work, args=(stage_idx,), name=f"pipeline-{stage.name}-{n}", daemon=True
+            ))
+    for t in threads:
+        t.start()
+
+    buffered = {}
+    next_idx = 0
+    finished = False
+    try:
+        while True:
+            entry = results.get()
+            if entry is _DONE:
+                finished = True
+                break
+            idx, out = entry
+            buffered[idx] = out
+            while next_idx in buffered and not stop.is_set():
+                yield buffered.pop(next_idx)
+                next_idx += 1
+    finally:
+        if not finished:
+            # Consumer stopped early (or failed): let the workers drain and exit
+            stop.set()
+            while results.get() is not _DONE:
+                pass
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
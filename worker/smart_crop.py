@@ -12,12 +12,18 @@ Free-tier solution using:
 
 import cv2
 import numpy as np
-import mediapipe as mp
+import mediapipe  # noqa: F401 (smart crop is unavailable without it)
 from dataclasses import dataclass
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+import heapq
 import json
 import os
 
+from analysis_cache import AnalysisCache, cache_key
+from frame_source import FRAME_SOURCE, open_frame_source
+from models import face_detectors
+from smart_thumbnail import calculate_brightness_score, calculate_sharpness_score, face_score
+
 
 @dataclass
 class FaceRegion:
@@ -29,6 +35,35 @@ class FaceRegion:
     confidence: float
 
 
+@dataclass
+class CropTrack:
+    """
+    Crop window position (top-left x, y) for every frame, as int32 arrays
+    indexed by frame number. Iterates as (frame_number, x, y) tuples.
+    """
+    x: np.ndarray
+    y: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def __iter__(self):
+        return zip(range(len(self.x)), self.x.tolist(), self.y.tolist())
+
+    @property
+    def frames(self) -> np.ndarray:
+        return np.arange(len(self.x), dtype=np.int32)
+
+    def mean_position(self) -> Tuple[int, int]:
+        """Integer mean (x, y) over all frames."""
+        if not len(self.x):
+            return 0, 0
+        return (
+            int(self.x.sum(dtype=np.int64)) // len(self.x),
+            int(self.y.sum(dtype=np.int64)) // len(self.y),
+        )
+
+
 @dataclass 
 class CropWindow:
     """Represents a crop window for a frame"""
@@ -38,6 +73,103 @@ class CropWindow:
     height: int
 
 
+class FaceTracker:
+    """
+    Follows face boxes between detector runs with pyramidal Lucas-Kanade
+    optical flow on feature points inside each box.
+    
+    Boxes are kept in source pixels; `scale` converts them to the (possibly
+    downscaled) analysis frames the tracker sees. A face is lost when too
+    few of its points survive the forward-backward consistency check.
+    """
+    
+    MAX_POINTS = 30  # feature points per face
+    MIN_POINTS = 4
+    MIN_SURVIVING_RATIO = 0.5  # of the points found at the last detection
+    MAX_FB_ERROR = 1.0  # forward-backward error in analysis pixels
+    LK_PARAMS = dict(winSize=(15, 15), maxLevel=2,
+                     criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+    
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+        self.prev_gray = None
+        self.faces: List[FaceRegion] = []
+        self.centers = None  # (n, 2) float face centers, source pixels
+        self.points = None  # (n, 1, 2) float32, analysis pixels
+        self.owners = None  # face index of each point
+        self.initial_counts = []
+        self.lost = False
+    
+    @property
+    def active(self) -> bool:
+        return self.points is not None
+    
+    def start(self, gray: np.ndarray, faces: List[FaceRegion]):
+        """Pick feature points inside each detected face."""
+        self.prev_gray = gray
+        self.faces = list(faces)
+        self.centers = np.array([(f.x, f.y) for f in faces], dtype=np.float64).reshape(-1, 2)
+        self.lost = False
+        self.points = None
+        if not faces:
+            return
+        
+        all_points, owners, counts = [], [], []
+        h, w = gray.shape[:2]
+        for idx, face in enumerate(self.faces):
+            # Inner 80% of the box, to stay off the background
+            half_w = face.width * self.scale * 0.4
+            half_h = face.height * self.scale * 0.4
+            cx, cy = face.x * self.scale, face.y * self.scale
+            x0, x1 = max(0, int(cx - half_w)), min(w, int(cx + half_w))
+            y0, y1 = max(0, int(cy - half_h)), min(h, int(cy + half_h))
+            if x1 - x0 < 4 or y1 - y0 < 4:
+                return
+            mask = np.zeros_like(gray)
+            mask[y0:y1, x0:x1] = 255
+            pts = cv2.goodFeaturesToTrack(gray, self.MAX_POINTS, 0.01, 3, mask=mask)
+            if pts is None or len(pts) < self.MIN_POINTS:
+                return  # a face we cannot track: leave it to the detector
+            all_points.append(pts)
+            owners.append(np.full(len(pts), idx))
+            counts.append(len(pts))
+        
+        self.points = np.concatenate(all_points).astype(np.float32)
+        self.owners = np.concatenate(owners)
+        self.initial_counts = counts
+    
+    def update(self, gray: np.ndarray) -> Optional[List[FaceRegion]]:
+        """Move every face with its points; None (and lost=True) if a face is lost."""
+        p1, st1, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None, **self.LK_PARAMS)
+        p0r, st2, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, p1, None, **self.LK_PARAMS)
+        fb_error = np.abs(self.points - p0r).reshape(-1, 2).max(axis=1)
+        good = (st1.ravel() == 1) & (st2.ravel() == 1) & (fb_error < self.MAX_FB_ERROR)
+        
+        moved = []
+        for idx, face in enumerate(self.faces):
+            mine = good & (self.owners == idx)
+            needed = max(self.MIN_POINTS, self.initial_counts[idx] * self.MIN_SURVIVING_RATIO)
+            if mine.sum() < needed:
+                self.points = None
+                self.lost = True
+                return None
+            shift = np.median((p1[mine] - self.points[mine]).reshape(-1, 2), axis=0)
+            self.centers[idx] += shift / self.scale
+            moved.append(FaceRegion(
+                x=int(round(self.centers[idx][0])),
+                y=int(round(self.centers[idx][1])),
+                width=face.width,
+                height=face.height,
+                confidence=face.confidence
+            ))
+        
+        self.faces = moved
+        self.points = p1[good]
+        self.owners = self.owners[good]
+        self.prev_gray = gray
+        return moved
+
+
 class SmartCropper:
     """
     Intelligent video cropper that tracks faces and keeps them in frame.
@@ -55,29 +187,76 @@ class SmartCropper:
     # Sampling: analyze every Nth frame (balance accuracy vs speed)
     SAMPLE_INTERVAL = 5  # Every 5th frame
     
+    # Adaptive sampling: every sampled frame is checked for a shot change
+    # (cheap colour histogram), but the face detector only runs on each
+    # sample for CUT_DENSE_FRAMES after a cut, then every
+    # STABLE_DETECT_INTERVAL frames while the shot holds
+    ADAPTIVE_SAMPLING = True
+    CUT_DENSE_FRAMES = 15
+    STABLE_DETECT_INTERVAL = 30
+    SHOT_CUT_THRESHOLD = 0.5  # Bhattacharyya distance between histograms
+    
+    # Face tracking: between detector runs, faces are followed with optical
+    # flow on every sample; the detector re-runs when the track is lost, or
+    # at the latest every TRACKED_DETECT_INTERVAL frames
+    FACE_TRACKING = True
+    TRACKED_DETECT_INTERVAL = 90
+    
     # Smoothing factor (0-1): higher = smoother but slower to follow
     SMOOTHING_FACTOR = 0.85
     
     # Face priority: weight for keeping faces in upper third (headroom)
     HEADROOM_RATIO = 0.35  # Face center should be in top 35% of crop
     
-    def __init__(self, min_detection_confidence: float = 0.5):
-        """Initialize the smart cropper with MediaPipe face detection."""
-        self.mp_face_detection = mp.solutions.face_detection
-        self.face_detector = self.mp_face_detection.FaceDetection(
-            model_selection=1,  # 1 = full range model (better for varied distances)
-            min_detection_confidence=min_detection_confidence
-        )
+    # Analysis resolution: frames are scaled so the long edge is at most this
+    # many pixels before face detection (0 = full resolution). MediaPipe's
+    # full-range model runs on a 192x192 input, so 4K frames buy nothing.
+    ANALYSIS_MAX_EDGE = int(os.environ.get("SMART_CROP_ANALYSIS_EDGE") or 640)
+    
+    # Dynamic crop: the per-frame track is reduced to a piecewise-linear path
+    # that stays within this many source pixels of it
+    PATH_TOLERANCE_PX = 12
+    
+    # Thumbnail candidates: analyzed frames are scored like smart thumbnails
+    # (brightness, sharpness, faces inside the crop window) and the best
+    # THUMBNAIL_CANDIDATES of every THUMBNAIL_BUCKET_SEC are kept, so any
+    # episode sliced out of the analysis has candidates of its own
+    THUMBNAIL_CANDIDATES = 3
+    THUMBNAIL_BUCKET_SEC = 10
+    
+    def __init__(self, min_detection_confidence: float = 0.5, analysis_max_edge: Optional[int] = None):
+        """Initialize the smart cropper; a shared face detector is leased on first use."""
+        self.face_detectors = face_detectors(1, min_detection_confidence)  # 1 = full range model
+        self.min_detection_confidence = min_detection_confidence
+        self.face_detector = None
+        self.analysis_max_edge = self.ANALYSIS_MAX_EDGE if analysis_max_edge is None else analysis_max_edge
+        self._rgb_buffer = None  # reused BGR->RGB conversion target
+        
+    def detect_faces(
+        self,
+        frame: np.ndarray,
+        source_size: Optional[Tuple[int, int]] = None
+    ) -> List[FaceRegion]:
+        """
+        Detect faces in a single frame using MediaPipe.
+        Coordinates are in source_size (width, height) pixels when the frame
+        was scaled down for analysis, otherwise in frame pixels.
+        """
+        if self.face_detector is None:
+            self.face_detector = self.face_detectors.acquire()
         
-    def detect_faces(self, frame: np.ndarray) -> List[FaceRegion]:
-        """Detect faces in a single frame using MediaPipe."""
-        # Convert BGR to RGB for MediaPipe
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # Convert BGR to RGB for MediaPipe into a buffer reused across frames
+        if self._rgb_buffer is None or self._rgb_buffer.shape != frame.shape:
+            self._rgb_buffer = np.empty_like(frame)
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buffer)
         results = self.face_detector.process(rgb_frame)
         
         faces = []
         if results.detections:
-            h, w = frame.shape[:2]
+            if source_size:
+                w, h = source_size
+            else:
+                h, w = frame.shape[:2]
             for detection in results.detections:
                 bbox = detection.location_data.relative_bounding_box
                 
@@ -156,60 +335,102 @@ class SmartCropper:
         
         return CropWindow(x=crop_x, y=crop_y, width=target_width, height=target_height)
     
+    def shot_signature(self, frame: np.ndarray) -> np.ndarray:
+        """Normalized hue/saturation histogram of a thumbnail of the frame."""
+        small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256])
+        return cv2.normalize(hist, hist).flatten()
+    
+    def is_shot_cut(self, prev_signature: Optional[np.ndarray], signature: np.ndarray) -> bool:
+        if prev_signature is None:
+            return False
+        distance = cv2.compareHist(prev_signature, signature, cv2.HISTCMP_BHATTACHARYYA)
+        return distance > self.SHOT_CUT_THRESHOLD
+    
     def smooth_crop_positions(
         self, 
-        crop_positions: List[Tuple[int, int]], 
-        smoothing: float = None
-    ) -> List[Tuple[int, int]]:
+        crop_positions: np.ndarray, 
+        smoothing: float = None,
+        resets: Optional[np.ndarray] = None
+    ) -> np.ndarray:
         """
         Apply temporal smoothing to crop positions to prevent jittery movement.
         Uses exponential moving average.
+        
+        crop_positions is an (n, 2) array of sampled (x, y); returns the same shape.
+        Where resets[i] is true (first sample of a new shot) the average
+        restarts from the raw position instead of drifting across the cut.
+        Each step truncates to whole pixels, which makes the recurrence
+        non-linear, so it runs as one pass over the samples (not every frame).
         """
         if smoothing is None:
             smoothing = self.SMOOTHING_FACTOR
-            
-        if len(crop_positions) <= 1:
-            return crop_positions
         
-        smoothed = [crop_positions[0]]
+        positions = np.asarray(crop_positions, dtype=np.int32).reshape(-1, 2)
+        if len(positions) <= 1:
+            return positions
         
-        for i in range(1, len(crop_positions)):
-            prev_x, prev_y = smoothed[-1]
-            curr_x, curr_y = crop_positions[i]
-            
+        xs = positions[:, 0].tolist()
+        ys = positions[:, 1].tolist()
+        restart = [False] * len(xs) if resets is None else [bool(r) for r in resets]
+        keep = 1 - smoothing
+        for i in range(1, len(xs)):
+            if restart[i]:
+                continue
             # Exponential smoothing
-            new_x = int(smoothing * prev_x + (1 - smoothing) * curr_x)
-            new_y = int(smoothing * prev_y + (1 - smoothing) * curr_y)
-            
-            smoothed.append((new_x, new_y))
+            xs[i] = int(smoothing * xs[i - 1] + keep * xs[i])
+            ys[i] = int(smoothing * ys[i - 1] + keep * ys[i])
         
-        return smoothed
+        return np.column_stack((xs, ys)).astype(np.int32)
     
     def analyze_video(
         self, 
         video_path: str,
         target_width: int = 1080,
         target_height: int = 1920,
-        progress_callback=None
+        progress_callback=None,
+        frame_source: Optional[str] = None,
+        start_sec: Optional[float] = None,
+        duration_sec: Optional[float] = None,
+        threads: Optional[int] = None
     ) -> dict:
         """
         Analyze video and generate smart crop data.
         
+        Only sampled frames are decoded into images, through a FrameSource
+        (frame_source: "grab", "ffmpeg" or "keyframe"; default from
+        ANALYSIS_FRAME_SOURCE).
+        
+        start_sec/duration_sec restrict the analysis to that range of the
+        video (the source seeks there, no copy of the range is needed). Frame
+        numbers, the crop track and total_frames are then relative to the range.
+        threads caps the decoder threads (the job slot's share of the host).
+        
         Returns a dict with:
-        - crop_data: list of (frame_number, x, y) tuples
+        - crop_data: CropTrack with the crop position of every frame
         - video_info: original video dimensions and fps
         - strategy: description of cropping strategy used
+        - shot_cuts: frame numbers where a new shot starts
+        - sample_faces: (frame_number, has_face) for every analyzed sample,
+          so slice_analysis() can rate a part of the video on its own
+        - thumbnail_candidates: rows of (frame_number, crop x, crop y,
+          brightness, sharpness, faces, num_faces); see thumbnail_candidates()
+        - thumbnail_faces: rows of (frame_number, center x, center y, width,
+          height) in source pixels, the detections of every candidate frame
         """
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise RuntimeError(f"Cannot open video: {video_path}")
+        source = open_frame_source(
+            video_path, self.SAMPLE_INTERVAL, max_edge=self.analysis_max_edge, backend=frame_source,
+            start_sec=start_sec, duration_sec=duration_sec, threads=threads
+        )
         
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        frame_width = source.info.width
+        frame_height = source.info.height
+        fps = source.info.fps
+        total_frames = source.range_frames
         
-        print(f"[SmartCrop] Analyzing video: {frame_width}x{frame_height} @ {fps}fps, {total_frames} frames")
+        print(f"[SmartCrop] Analyzing video: {frame_width}x{frame_height} @ {fps}fps, {total_frames} frames "
+              f"from {source.start_sec:.2f}s (detecting at {source.frame_size[0]}x{source.frame_size[1]})")
         
         # Calculate crop dimensions that fit within source
         # We need to crop to 9:16 from source
@@ -226,57 +447,112 @@ class SmartCropper:
         
         print(f"[SmartCrop] Crop dimensions: {crop_width}x{crop_height}")
         
-        # Sample frames and detect faces
-        frame_crops = []  # (frame_number, x, y)
+        # Sample frames and detect (or track) faces
+        frame_crops = []  # (frame_number, x, y, starts_shot, has_face)
         face_detection_count = 0
+        detector_runs = 0
+        shot_cuts = []
+        sampled_count = 0
         
-        frame_number = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            if frame_number % self.SAMPLE_INTERVAL == 0:
-                faces = self.detect_faces(frame)
+        tracker = None
+        if self.FACE_TRACKING and self.ADAPTIVE_SAMPLING:
+            tracker = FaceTracker(source.frame_size[0] / frame_width)
+        prev_signature = None
+        shot_start = 0
+        last_detect = None
+        last_pct = -1
+        scale = source.frame_size[0] / frame_width
+        bucket_frames = max(1, int(self.THUMBNAIL_BUCKET_SEC * (fps or 30.0)))
+        candidate_heaps: Dict[int, list] = {}
+        try:
+            for frame_number, frame in source.frames():
+                sampled_count += 1
+                if progress_callback and total_frames:
+                    pct = int((frame_number / total_frames) * 100)
+                    if pct != last_pct:
+                        progress_callback(pct, "analyzing_faces")
+                        last_pct = pct
+                
+                cut = False
+                detect = True
+                if self.ADAPTIVE_SAMPLING:
+                    signature = self.shot_signature(frame)
+                    cut = self.is_shot_cut(prev_signature, signature)
+                    prev_signature = signature
+                    if cut:
+                        shot_cuts.append(frame_number)
+                        shot_start = frame_number
+                    interval = self.STABLE_DETECT_INTERVAL
+                    if tracker is not None and tracker.active:
+                        interval = self.TRACKED_DETECT_INTERVAL
+                    detect = (
+                        last_detect is None
+                        or cut
+                        or frame_number - shot_start < self.CUT_DENSE_FRAMES
+                        or frame_number - last_detect >= interval
+                    )
+                
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if tracker is not None else None
+                faces = None
+                if not detect and tracker is not None and tracker.active:
+                    # Between detector runs: follow the last detections with optical flow,
+                    # and fall back to the detector as soon as the track is lost
+                    faces = tracker.update(gray)
+                if faces is None:
+                    if not detect and not (tracker is not None and tracker.lost):
+                        continue
+                    faces = self.detect_faces(frame, (frame_width, frame_height))
+                    detector_runs += 1
+                    last_detect = frame_number
+                    if tracker is not None:
+                        tracker.start(gray, faces)
+                
                 if faces:
                     face_detection_count += 1
                 
                 crop = self.calculate_crop_region(
                     faces, frame_width, frame_height, crop_width, crop_height
                 )
-                frame_crops.append((frame_number, crop.x, crop.y))
+                frame_crops.append((frame_number, crop.x, crop.y, cut, bool(faces)))
                 
-                if progress_callback and frame_number % 100 == 0:
-                    pct = int((frame_number / total_frames) * 100)
-                    progress_callback(pct, "analyzing_faces")
-            
-            frame_number += 1
+                candidate = self.score_thumbnail_candidate(frame, scale, faces, crop, target_width)
+                heap = candidate_heaps.setdefault(frame_number // bucket_frames, [])
+                # Ranked by the score_frame total: brightness + sharpness + faces; the
+                # detections are kept to score the faces again in the rendered window
+                detections = [(f.x, f.y, f.width, f.height) for f in faces]
+                entry = (candidate[2] + candidate[3] + candidate[4], frame_number, candidate, detections)
+                if len(heap) < self.THUMBNAIL_CANDIDATES:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+        finally:
+            source.close()
         
-        cap.release()
+        # Smooth the crop positions (restarting at every shot cut)
+        sampled = np.array(frame_crops, dtype=np.int32).reshape(-1, 5)
+        sample_frames = sampled[:, 0]
+        smoothed = self.smooth_crop_positions(sampled[:, 1:3], resets=sampled[:, 3])
         
-        # Smooth the crop positions
-        positions = [(x, y) for _, x, y in frame_crops]
-        smoothed = self.smooth_crop_positions(positions)
-        
-        # Update with smoothed positions
-        smoothed_crops = [
-            (frame_crops[i][0], smoothed[i][0], smoothed[i][1]) 
-            for i in range(len(frame_crops))
+        # Hold each shot's last position up to the frame before the cut, so
+        # interpolation jumps at the cut instead of panning across it
+        holds = [
+            i for i in np.flatnonzero(sampled[:, 3])
+            if i > 0 and sample_frames[i] - 1 > sample_frames[i - 1]
         ]
+        if holds:
+            sample_frames = np.insert(sample_frames, holds, sample_frames[holds] - 1)
+            smoothed = np.insert(smoothed, holds, smoothed[np.array(holds) - 1], axis=0)
         
         # Interpolate for all frames (not just sampled ones)
-        full_crop_data = self._interpolate_crops(smoothed_crops, total_frames)
+        full_crop_data = self._interpolate_crops(sample_frames, smoothed, total_frames)
         
         # Determine strategy description
         detection_ratio = face_detection_count / len(frame_crops) if frame_crops else 0
-        if detection_ratio > 0.7:
-            strategy = "face_tracking"
-        elif detection_ratio > 0.3:
-            strategy = "mixed_face_center"
-        else:
-            strategy = "center_crop"
+        strategy = crop_strategy(detection_ratio)
         
         print(f"[SmartCrop] Analysis complete: {face_detection_count}/{len(frame_crops)} frames with faces ({detection_ratio:.1%})")
+        print(f"[SmartCrop] {len(shot_cuts)} shot cut(s), face detector ran on {detector_runs}/{sampled_count} "
+              f"sampled frames, {len(frame_crops) - detector_runs} tracked")
         print(f"[SmartCrop] Strategy: {strategy}")
         
         return {
@@ -290,69 +566,167 @@ class SmartCropper:
                 "crop_height": crop_height
             },
             "strategy": strategy,
-            "face_detection_ratio": detection_ratio
+            "face_detection_ratio": detection_ratio,
+            "shot_cuts": shot_cuts,
+            "sample_faces": sampled[:, [0, 4]],
+            "thumbnail_candidates": np.array(
+                sorted((frame_number,) + c for heap in candidate_heaps.values() for _, frame_number, c, _ in heap),
+                dtype=np.float64
+            ).reshape(-1, 7),
+            "thumbnail_faces": np.array(
+                sorted(
+                    (frame_number,) + f
+                    for heap in candidate_heaps.values() for _, frame_number, _, detections in heap
+                    for f in detections
+                ),
+                dtype=np.float64
+            ).reshape(-1, 5)
         }
     
+    def score_thumbnail_candidate(
+        self,
+        frame: np.ndarray,
+        scale: float,
+        faces: List[FaceRegion],
+        crop: CropWindow,
+        target_width: int = 1080
+    ) -> Tuple[int, int, float, float, float, int]:
+        """
+        (crop x, crop y, brightness, sharpness, faces, num_faces) of the
+        part of an analysis frame inside the crop window, with the weights
+        of smart_thumbnail.score_frame. Sharpness is rated at the rendered
+        size (target_width wide), as score_frame rates the thumbnail.
+        """
+        x0, y0 = int(crop.x * scale), int(crop.y * scale)
+        x1, y1 = int((crop.x + crop.width) * scale), int((crop.y + crop.height) * scale)
+        window = frame[y0:y1, x0:x1]
+        centers = window_face_centers([(f.x, f.y) for f in faces], crop.x, crop.y, crop.width, crop.height)
+        return (
+            crop.x,
+            crop.y,
+            round(calculate_brightness_score(window), 2),
+            round(calculate_sharpness_score(window, window.shape[1] / target_width), 2),
+            round(face_score(centers), 2),
+            len(centers),
+        )
+    
     def _interpolate_crops(
         self, 
-        sampled_crops: List[Tuple[int, int, int]], 
+        sample_frames: np.ndarray,
+        sample_positions: np.ndarray,
         total_frames: int
-    ) -> List[Tuple[int, int, int]]:
-        """Interpolate crop positions for frames between samples."""
-        if not sampled_crops:
-            return [(i, 0, 0) for i in range(total_frames)]
-        
-        result = []
-        sample_idx = 0
-        
-        for frame_num in range(total_frames):
-            # Find surrounding samples
-            while (sample_idx < len(sampled_crops) - 1 and 
-                   sampled_crops[sample_idx + 1][0] <= frame_num):
-                sample_idx += 1
-            
-            if sample_idx >= len(sampled_crops) - 1:
-                # Use last sample
-                _, x, y = sampled_crops[-1]
-            else:
-                # Interpolate between samples
-                f1, x1, y1 = sampled_crops[sample_idx]
-                f2, x2, y2 = sampled_crops[sample_idx + 1]
-                
-                if f2 == f1:
-                    t = 0
-                else:
-                    t = (frame_num - f1) / (f2 - f1)
-                
-                x = int(x1 + t * (x2 - x1))
-                y = int(y1 + t * (y2 - y1))
-            
-            result.append((frame_num, x, y))
+    ) -> CropTrack:
+        """
+        Interpolate crop positions for frames between samples.
+        Frames after the last sample hold its position.
+        """
+        if not len(sample_frames):
+            empty = np.zeros(total_frames, dtype=np.int32)
+            return CropTrack(x=empty, y=empty.copy())
+        
+        sample_frames = np.asarray(sample_frames, dtype=np.int64)
+        sx = sample_positions[:, 0].astype(np.int64)
+        sy = sample_positions[:, 1].astype(np.int64)
+        last = len(sample_frames) - 1
         
-        return result
+        frames = np.arange(total_frames, dtype=np.int64)
+        # Sample at or before each frame, and the one after it
+        idx = np.clip(np.searchsorted(sample_frames, frames, side="right") - 1, 0, last)
+        nxt = np.minimum(idx + 1, last)
+        
+        f1, f2 = sample_frames[idx], sample_frames[nxt]
+        span = f2 - f1
+        t = np.where(span == 0, 0.0, (frames - f1) / np.where(span == 0, 1, span))
+        
+        x = np.trunc(sx[idx] + t * (sx[nxt] - sx[idx]))
+        y = np.trunc(sy[idx] + t * (sy[nxt] - sy[idx]))
+        held = idx >= last
+        x[held] = sx[-1]
+        y[held] = sy[-1]
+        
+        return CropTrack(x=x.astype(np.int32), y=y.astype(np.int32))
     
-    def generate_ffmpeg_filter(self, analysis_result: dict) -> str:
+    def dominant_crop_position(self, analysis_result: dict) -> Tuple[int, int]:
+        """Average (x, y) of the crop window over all frames."""
+        return analysis_result["crop_data"].mean_position()
+    
+    def crop_keyframes(
+        self,
+        analysis_result: dict,
+        tolerance: Optional[float] = None
+    ) -> List[Tuple[float, int, int]]:
+        """
+        Reduce the per-frame crop track to a piecewise-linear path of
+        (time_sec, x, y) keyframes (Ramer-Douglas-Peucker on x and y).
+        Linear interpolation between keyframes stays within `tolerance`
+        pixels of the track on both axes.
+        """
+        if tolerance is None:
+            tolerance = self.PATH_TOLERANCE_PX
+        track = analysis_result["crop_data"]
+        fps = analysis_result["video_info"]["fps"] or 30.0
+        n = len(track)
+        if n == 0:
+            return []
+        
+        frames = track.frames.astype(np.float64)
+        xs = track.x.astype(np.float64)
+        ys = track.y.astype(np.float64)
+        keep = np.zeros(n, dtype=bool)
+        keep[0] = keep[-1] = True
+        
+        stack = [(0, n - 1)]
+        while stack:
+            a, b = stack.pop()
+            if b - a < 2:
+                continue
+            t = (frames[a + 1:b] - frames[a]) / (frames[b] - frames[a])
+            dev = np.maximum(
+                np.abs(xs[a + 1:b] - (xs[a] + t * (xs[b] - xs[a]))),
+                np.abs(ys[a + 1:b] - (ys[a] + t * (ys[b] - ys[a]))),
+            )
+            i = int(np.argmax(dev))
+            if dev[i] > tolerance:
+                m = a + 1 + i
+                keep[m] = True
+                stack.append((a, m))
+                stack.append((m, b))
+        
+        path = [
+            (round(int(f) / fps, 3), int(track.x[f]), int(track.y[f]))
+            for f in np.flatnonzero(keep)
+        ]
+        if all(p[1:] == path[0][1:] for p in path):
+            return path[:1]  # the window never moves
+        return path
+    
+    def generate_ffmpeg_filter(self, analysis_result: dict, dynamic: bool = False) -> str:
         """
         Generate FFmpeg filter string for smart cropping.
         
-        For dynamic cropping, we generate a crop filter with expressions.
-        Since FFmpeg crop filter doesn't support per-frame variables easily,
-        we use a simplified approach: find the dominant crop region.
+        Static (default): one crop window at the average position over the
+        whole clip. Works well with smoothing on single-speaker shots.
         
-        For more advanced dynamic cropping, we'd need to use ffmpeg's sendcmd
-        or process frame-by-frame (slower).
+        Dynamic: the crop window pans along the keyframe path from
+        crop_keyframes(). The path becomes x/y expressions in t that the crop
+        filter evaluates per frame, so panning is rendered by the same ffmpeg
+        encode with no extra pass or per-frame Python.
         """
         info = analysis_result["video_info"]
-        crop_data = analysis_result["crop_data"]
-        
-        # For POC: use average crop position (works well with smoothing)
-        # This gives a stable crop that's centered on where faces appear most
-        avg_x = sum(c[1] for c in crop_data) // len(crop_data)
-        avg_y = sum(c[2] for c in crop_data) // len(crop_data)
         
         crop_w = info["crop_width"]
         crop_h = info["crop_height"]
         
+        path = self.crop_keyframes(analysis_result) if dynamic else []
+        if len(path) > 1:
+            x_expr = "+".join(crop_path_terms(path, 1))
+            y_expr = "+".join(crop_path_terms(path, 2))
+            return f"crop={crop_w}:{crop_h}:'{x_expr}':'{y_expr}',scale=1080:1920"
+        
+        # For POC: use average crop position (works well with smoothing)
+        # This gives a stable crop that's centered on where faces appear most
+        avg_x, avg_y = self.dominant_crop_position(analysis_result)
+        
         # Build FFmpeg filter: crop then scale to target
         filter_str = f"crop={crop_w}:{crop_h}:{avg_x}:{avg_y},scale=1080:1920"
         
@@ -387,9 +761,234 @@ class SmartCropper:
         
         return output_path
     
+    def analysis_params(self, frame_source: Optional[str] = None) -> dict:
+        """Everything that changes analyze_video output for the same input (cache key part)."""
+        return {
+            "version": 6,
+            "frame_source": (frame_source or FRAME_SOURCE).lower(),
+            "min_detection_confidence": self.min_detection_confidence,
+            "analysis_max_edge": self.analysis_max_edge,
+            "sample_interval": self.SAMPLE_INTERVAL,
+            "smoothing": self.SMOOTHING_FACTOR,
+            "headroom": self.HEADROOM_RATIO,
+            "adaptive": self.ADAPTIVE_SAMPLING,
+            "cut_dense_frames": self.CUT_DENSE_FRAMES,
+            "stable_detect_interval": self.STABLE_DETECT_INTERVAL,
+            "shot_cut_threshold": self.SHOT_CUT_THRESHOLD,
+            "face_tracking": self.FACE_TRACKING,
+            "tracked_detect_interval": self.TRACKED_DETECT_INTERVAL,
+        }
+    
     def close(self):
-        """Clean up resources."""
-        self.face_detector.close()
+        """Return the leased face detector to the shared pool."""
+        if self.face_detector is not None:
+            self.face_detectors.release(self.face_detector)
+            self.face_detector = None
+
+
+def crop_path_terms(
+    path: List[Tuple[float, int, int]],
+    axis: int,
+    offset: float = 0.0,
+    start: Optional[float] = None,
+    end: Optional[float] = None
+) -> List[str]:
+    """
+    FFmpeg expression terms for one axis (1 = x, 2 = y) of a keyframe path.
+    
+    Each term is one linear piece gated to its time range, so the sum of the
+    terms is the position at time t. The sum stays flat (no nested if()),
+    which keeps long paths clear of ffmpeg's expression nesting limit.
+    
+    offset shifts the path in time; start/end limit it to [start, end)
+    (open-ended when None). The first piece extends back to start and the
+    last keyframe holds until end.
+    """
+    bounds = [start] + [t + offset for t, _, _ in path[1:]] + [end]
+    terms = []
+    for i, point in enumerate(path):
+        lo, hi = bounds[i], bounds[i + 1]
+        if lo is not None and hi is not None and lo >= hi:
+            continue
+        
+        v1 = point[axis]
+        if i + 1 < len(path) and path[i + 1][axis] != v1:
+            t1 = point[0] + offset
+            dv = path[i + 1][axis] - v1
+            dt = path[i + 1][0] - point[0]
+            value = f"({v1}{dv:+d}*(t-{t1:.3f})/{dt:.3f})"
+        else:
+            value = str(v1)
+        
+        gates = []
+        if lo is not None:
+            gates.append(f"gte(t,{lo:.3f})")
+        if hi is not None:
+            gates.append(f"lt(t,{hi:.3f})")
+        terms.append("*".join([value] + gates))
+    return terms
+
+
+def window_face_centers(
+    centers: List[Tuple[float, float]], x: int, y: int, width: int, height: int
+) -> List[Tuple[float, float]]:
+    """Face centers (source pixels) inside a crop window, relative to it (0-1), for face_score()."""
+    return [
+        ((cx - x) / width, (cy - y) / height)
+        for cx, cy in centers
+        if x <= cx < x + width and y <= cy < y + height
+    ]
+
+
+def crop_strategy(face_detection_ratio: float) -> str:
+    """Strategy description for the share of analyzed frames that had faces."""
+    if face_detection_ratio > 0.7:
+        return "face_tracking"
+    if face_detection_ratio > 0.3:
+        return "mixed_face_center"
+    return "center_crop"
+
+
+def slice_analysis(analysis: dict, start_sec: float, duration_sec: Optional[float] = None) -> dict:
+    """
+    analyze_video result for [start_sec, start_sec+duration_sec) of the analyzed
+    video, cut out of a longer analysis: the crop track, shot cuts and face
+    samples are re-based to frame 0 of the slice, and the strategy is rated on
+    the slice's own samples.
+    """
+    info = analysis["video_info"]
+    fps = info["fps"] or 30.0
+    track = analysis["crop_data"]
+    first = min(len(track), max(0, int(round(start_sec * fps))))
+    last = len(track) if not duration_sec else min(len(track), int(round((start_sec + duration_sec) * fps)))
+    last = max(first, last)
+    
+    samples = analysis.get("sample_faces")
+    if samples is not None:
+        samples = samples[(samples[:, 0] >= first) & (samples[:, 0] < last)] - [first, 0]
+    if samples is not None and len(samples):
+        detection_ratio = float(samples[:, 1].mean())
+    else:
+        detection_ratio = analysis["face_detection_ratio"]
+    
+    candidates = analysis.get("thumbnail_candidates")
+    if candidates is not None:
+        candidates = candidates[(candidates[:, 0] >= first) & (candidates[:, 0] < last)]
+        candidates[:, 0] -= first
+    candidate_faces = analysis.get("thumbnail_faces")
+    if candidate_faces is not None:
+        candidate_faces = candidate_faces[(candidate_faces[:, 0] >= first) & (candidate_faces[:, 0] < last)]
+        candidate_faces[:, 0] -= first
+    
+    return dict(
+        analysis,
+        crop_data=CropTrack(x=track.x[first:last].copy(), y=track.y[first:last].copy()),
+        thumbnail_candidates=candidates,
+        thumbnail_faces=candidate_faces,
+        video_info=dict(info, total_frames=last - first),
+        strategy=crop_strategy(detection_ratio),
+        face_detection_ratio=detection_ratio,
+        shot_cuts=[f - first for f in analysis["shot_cuts"] if first < f < last],
+        sample_faces=samples,
+    )
+
+
+def thumbnail_candidates(result: dict, dynamic: bool = False) -> List[dict]:
+    """
+    Thumbnail candidates harvested by analyze_video for a smart_crop_video
+    result, as dicts with the timestamp (seconds into the analyzed range),
+    score_frame-style scores and the crop window the encode renders at that
+    time: the static window (crop_x, crop_y), or with dynamic the position on
+    crop_path. The face term is scored again from the candidate's detections
+    inside that window; brightness and sharpness are those of the sample's
+    own window. Sorted best first.
+    """
+    analysis = result["analysis"]
+    rows = analysis.get("thumbnail_candidates")
+    if rows is None:
+        return []
+    info = analysis["video_info"]
+    fps = info["fps"] or 30.0
+    crop_w, crop_h = info["crop_width"], info["crop_height"]
+    detections = analysis.get("thumbnail_faces")
+    if detections is None:
+        detections = np.zeros((0, 5))
+    path = (result.get("crop_path") or []) if dynamic else []
+    candidates = []
+    for frame_number, _, _, brightness, sharpness, _, _ in rows.tolist():
+        timestamp = frame_number / fps
+        if len(path) > 1:
+            times = [t for t, _, _ in path]
+            x = int(np.interp(timestamp, times, [px for _, px, _ in path]))
+            y = int(np.interp(timestamp, times, [py for _, _, py in path]))
+        else:
+            x, y = int(result["crop_x"]), int(result["crop_y"])
+        centers = window_face_centers(
+            [(cx, cy) for _, cx, cy, _, _ in detections[detections[:, 0] == frame_number].tolist()],
+            x, y, crop_w, crop_h
+        )
+        faces = round(float(face_score(centers)), 2)
+        candidates.append({
+            "timestamp": round(timestamp, 3),
+            "scores": {
+                "brightness": brightness,
+                "sharpness": sharpness,
+                "faces": faces,
+                "num_faces": len(centers),
+                "total": round(brightness + sharpness + faces, 2)
+            },
+            "crop_window": {"x": x, "y": y, "width": crop_w, "height": crop_h}
+        })
+    candidates.sort(key=lambda c: c["scores"]["total"], reverse=True)
+    return candidates
+
+
+def _load_cached_analysis(cache: AnalysisCache, key: str) -> Optional[dict]:
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    arrays, meta = entry
+    meta["crop_data"] = CropTrack(x=arrays.pop("x"), y=arrays.pop("y"))
+    meta.update(arrays)
+    return meta
+
+
+def _store_analysis(cache: AnalysisCache, key: str, analysis: dict):
+    track = analysis["crop_data"]
+    arrays = {k: v for k, v in analysis.items() if isinstance(v, np.ndarray)}
+    meta = {k: v for k, v in analysis.items() if k != "crop_data" and k not in arrays}
+    cache.put(key, dict(arrays, x=track.x, y=track.y), meta)
+
+
+def _crop_result(cropper: SmartCropper, analysis: dict) -> dict:
+    """smart_crop_video result (filters, path, dominant position) for an analysis."""
+    crop_filter = cropper.generate_ffmpeg_filter(analysis)
+    dynamic_filter = cropper.generate_ffmpeg_filter(analysis, dynamic=True)
+    crop_path = cropper.crop_keyframes(analysis)
+    crop_x, crop_y = cropper.dominant_crop_position(analysis)
+    
+    print(f"[SmartCrop] Using filter: {crop_filter}")
+    
+    return {
+        "filter": crop_filter,
+        "analysis": analysis,
+        "crop_width": analysis["video_info"]["crop_width"],
+        "crop_height": analysis["video_info"]["crop_height"],
+        "crop_x": crop_x,
+        "crop_y": crop_y,
+        "strategy": analysis["strategy"],
+        "crop_path": crop_path,
+        "dynamic_filter": dynamic_filter
+    }
+
+
+def slice_smart_crop_result(result: dict, start_sec: float, duration_sec: Optional[float] = None) -> dict:
+    """
+    smart_crop_video result for a part of the analyzed video (see
+    slice_analysis), e.g. one episode out of a whole-source analysis. Paths
+    and filters are relative to start_sec.
+    """
+    return _crop_result(SmartCropper(), slice_analysis(result["analysis"], start_sec, duration_sec))
 
 
 def smart_crop_video(
@@ -397,7 +996,12 @@ def smart_crop_video(
     output_path: str,
     target_width: int = 1080,
     target_height: int = 1920,
-    progress_callback=None
+    progress_callback=None,
+    cache: Optional[AnalysisCache] = None,
+    content_key: Optional[str] = None,
+    start_sec: Optional[float] = None,
+    duration_sec: Optional[float] = None,
+    threads: Optional[int] = None
 ) -> dict:
     """
     Main entry point: analyze and crop a video to 9:16 vertical format.
@@ -408,6 +1012,12 @@ def smart_crop_video(
         target_width: Output width (default 1080)
         target_height: Output height (default 1920)
         progress_callback: Optional callback(pct, stage)
+        cache: Optional AnalysisCache for analysis results
+        content_key: What is analyzed (source fingerprint + range);
+            required for the cache to be used
+        start_sec: Analyze from this time (seconds into input_path)
+        duration_sec: Analyze this many seconds (default: to the end)
+        threads: Decoder threads for the analysis (default: decoder default)
     
     Returns:
         dict with processing info
@@ -415,29 +1025,32 @@ def smart_crop_video(
     cropper = SmartCropper()
     
     try:
-        # Analyze video for face positions
-        if progress_callback:
-            progress_callback(0, "analyzing")
-        
-        analysis = cropper.analyze_video(
-            input_path,
-            target_width,
-            target_height,
-            progress_callback
-        )
+        key = None
+        analysis = None
+        if cache is not None and content_key:
+            key = cache_key(content_key, cropper.analysis_params())
+            analysis = _load_cached_analysis(cache, key)
+            if analysis is not None:
+                print(f"[SmartCrop] Using cached analysis {key[:12]}")
         
-        # Generate FFmpeg filter
-        crop_filter = cropper.generate_ffmpeg_filter(analysis)
-        
-        print(f"[SmartCrop] Using filter: {crop_filter}")
+        if analysis is None:
+            # Analyze video for face positions
+            if progress_callback:
+                progress_callback(0, "analyzing")
+            
+            analysis = cropper.analyze_video(
+                input_path,
+                target_width,
+                target_height,
+                progress_callback,
+                start_sec=start_sec,
+                duration_sec=duration_sec,
+                threads=threads
+            )
+            if key:
+                _store_analysis(cache, key, analysis)
         
-        return {
-            "filter": crop_filter,
-            "analysis": analysis,
-            "crop_width": analysis["video_info"]["crop_width"],
-            "crop_height": analysis["video_info"]["crop_height"],
-            "strategy": analysis["strategy"]
-        }
+        return _crop_result(cropper, analysis)
         
     finally:
         cropper.close()
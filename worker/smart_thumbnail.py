@@ -8,8 +8,9 @@ it analyzes multiple frames and scores them based on:
 - Sharpness (avoid blurry frames)
 - Face presence (prefer frames with visible faces)
 
-The best-scoring frame is selected as the thumbnail, and all candidates
-are saved for admin review if needed.
+The best-scoring frame is selected as the thumbnail. Frames are scored in
+memory and only the winner is encoded; candidates are also saved as JPEGs
+for admin review when SMART_THUMBNAIL_SAVE_CANDIDATES is set.
 """
 
 import cv2
@@ -17,58 +18,27 @@ import numpy as np
 import os
 from typing import Dict, List, Tuple, Optional, Callable
 
-# MediaPipe for face detection
-try:
-    import mediapipe as mp
-    MEDIAPIPE_AVAILABLE = True
-except ImportError:
-    MEDIAPIPE_AVAILABLE = False
-    print("[SmartThumbnail] MediaPipe not available, face detection disabled")
-
+from frame_source import FfmpegFrameSource, FrameSource, open_frame_source
 
-def extract_frame_at_time(video_path: str, timestamp_sec: float, output_path: str) -> bool:
-    """
-    Extract a single frame from video at specified timestamp.
-    
-    Args:
-        video_path: Path to input video
-        timestamp_sec: Time in seconds to extract frame
-        output_path: Path to save extracted frame
-        
-    Returns:
-        True if successful, False otherwise
-    """
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        return False
-    
-    try:
-        # Set position to timestamp
-        cap.set(cv2.CAP_PROP_POS_MSEC, timestamp_sec * 1000)
-        ret, frame = cap.read()
-        
-        if ret and frame is not None:
-            cv2.imwrite(output_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
-            return True
-        return False
-    finally:
-        cap.release()
+# Write every scored candidate to <output_dir>/thumb-candidates for admin review
+SAVE_CANDIDATES = os.environ.get("SMART_THUMBNAIL_SAVE_CANDIDATES", "").strip().lower() in ("1", "true", "yes")
 
+# Two-tier selection: brightness and sharpness are scored on up to
+# PREFILTER_CANDIDATES downscaled frames (long edge PREFILTER_MAX_EDGE), and
+# face detection only runs on the FACE_SCORED_CANDIDATES best of them.
+# Candidates come from one ffmpeg pass: the clip's keyframes (the decoder
+# skips every other frame) when there are at least MIN_CANDIDATES of them,
+# otherwise the first I/P frame of evenly spaced intervals (B-frames are
+# never decoded)
+PREFILTER_CANDIDATES = int(os.environ.get("SMART_THUMBNAIL_CANDIDATES") or 40)
+PREFILTER_MAX_EDGE = 360
+MIN_CANDIDATES = 30
+FACE_SCORED_CANDIDATES = 3
 
-def get_video_duration(video_path: str) -> float:
-    """Get video duration in seconds."""
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        return 0.0
-    
-    try:
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-        if fps > 0:
-            return frame_count / fps
-        return 0.0
-    finally:
-        cap.release()
+# MediaPipe for face detection (detectors are shared through the model registry)
+from models import MEDIAPIPE_AVAILABLE, face_detectors
+if not MEDIAPIPE_AVAILABLE:
+    print("[SmartThumbnail] MediaPipe not available, face detection disabled")
 
 
 def calculate_brightness_score(frame: np.ndarray) -> float:
@@ -101,16 +71,48 @@ def calculate_brightness_score(frame: np.ndarray) -> float:
     return max(0, min(40, score))
 
 
-def calculate_sharpness_score(frame: np.ndarray) -> float:
+def brightness_scores(grays: np.ndarray) -> np.ndarray:
+    """calculate_brightness_score for a stack of grayscale frames (N, H, W) at once."""
+    brightness = grays.mean(axis=(1, 2)) / 255.0
+    score = np.where(
+        brightness < 0.3,
+        (brightness / 0.3) * 40.0,
+        np.where(brightness <= 0.7, 40.0, 40.0 - ((brightness - 0.7) / 0.3) * 40.0),
+    )
+    score[brightness < 0.05] = 0.0
+    return np.clip(score, 0, 40)
+
+
+def sharpness_scores(grays: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    """
+    calculate_sharpness_score for a stack of grayscale frames (N, H, W) at
+    once: variance of the 3x3 Laplacian over each frame's interior.
+    """
+    g = grays.astype(np.float32)
+    laplacian = (
+        g[:, :-2, 1:-1] + g[:, 2:, 1:-1] + g[:, 1:-1, :-2] + g[:, 1:-1, 2:]
+        - 4.0 * g[:, 1:-1, 1:-1]
+    )
+    variance = laplacian.reshape(len(g), -1).var(axis=1, dtype=np.float64) * scale ** 2
+    return np.clip(np.minimum(variance / 500.0, 1.0) * 30.0, 0, 30)
+
+
+def calculate_sharpness_score(frame: np.ndarray, scale: float = 1.0) -> float:
     """
     Score frame sharpness (0-30 points) using Laplacian variance.
     Higher variance = sharper image (more edges/details).
+    
+    scale is the frame's size relative to the size it is rated at (e.g.
+    frame width / thumbnail width for a downscaled thumbnail candidate).
+    Shrinking a frame packs its edges into fewer pixels, and the variance
+    grows about with the square of the shrink factor, so it is multiplied
+    by scale**2 to stay comparable with a frame scored at full size.
     """
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     
     # Calculate Laplacian variance
     laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-    variance = laplacian.var()
+    variance = laplacian.var() * scale ** 2
     
     # Normalize to 0-30 scale
     # Variance typically ranges from 0 (very blurry) to 1000+ (very sharp)
@@ -121,6 +123,37 @@ def calculate_sharpness_score(frame: np.ndarray) -> float:
     return max(0, min(30, score))
 
 
+def face_score(face_centers: List[Tuple[float, float]]) -> float:
+    """
+    Face presence score (0-40 points) for faces whose centers are given
+    relative to the frame (0-1 on both axes).
+    """
+    if not face_centers:
+        return 0.0
+    
+    num_faces = len(face_centers)
+    base_score = 30.0  # Full points for having faces
+    
+    # Bonus for multiple faces (up to +10 bonus)
+    if num_faces > 1:
+        bonus = min(num_faces - 1, 3) * 3.33  # Up to +10 for 4+ faces
+    else:
+        bonus = 0
+    
+    # Bonus for centered faces
+    center_bonus = 0
+    for face_center_x, face_center_y in face_centers:
+        # Distance from image center (0.5, 0.5)
+        dist_from_center = np.sqrt((face_center_x - 0.5)**2 + (face_center_y - 0.5)**2)
+        
+        # Centered faces get bonus (max +5 for perfect center)
+        if dist_from_center < 0.3:
+            center_bonus = max(center_bonus, 5 * (1 - dist_from_center / 0.3))
+    
+    total_score = base_score + bonus + center_bonus
+    return min(40, total_score)
+
+
 def calculate_face_score(frame: np.ndarray) -> Tuple[float, int]:
     """
     Score frame based on face presence (0-30 points).
@@ -133,45 +166,20 @@ def calculate_face_score(frame: np.ndarray) -> Tuple[float, int]:
         return 0.0, 0
     
     try:
-        mp_face_detection = mp.solutions.face_detection
-        
-        with mp_face_detection.FaceDetection(
-            model_selection=1,  # Full range model
-            min_detection_confidence=0.5
-        ) as face_detection:
+        # Full range model, leased from the process-wide pool
+        with face_detectors(model_selection=1, min_detection_confidence=0.5).lease() as face_detection:
             # Convert BGR to RGB for MediaPipe
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             results = face_detection.process(rgb_frame)
-            
-            if not results.detections:
-                return 0.0, 0
-            
-            num_faces = len(results.detections)
-            base_score = 30.0  # Full points for having faces
-            
-            # Bonus for multiple faces (up to +10 bonus)
-            if num_faces > 1:
-                bonus = min(num_faces - 1, 3) * 3.33  # Up to +10 for 4+ faces
-            else:
-                bonus = 0
-            
-            # Bonus for centered faces
-            center_bonus = 0
-            for detection in results.detections:
-                bbox = detection.location_data.relative_bounding_box
-                # Face center (relative to image center)
-                face_center_x = bbox.xmin + bbox.width / 2
-                face_center_y = bbox.ymin + bbox.height / 2
-                
-                # Distance from image center (0.5, 0.5)
-                dist_from_center = np.sqrt((face_center_x - 0.5)**2 + (face_center_y - 0.5)**2)
-                
-                # Centered faces get bonus (max +5 for perfect center)
-                if dist_from_center < 0.3:
-                    center_bonus = max(center_bonus, 5 * (1 - dist_from_center / 0.3))
-            
-            total_score = base_score + bonus + center_bonus
-            return min(40, total_score), num_faces
+        
+        if not results.detections:
+            return 0.0, 0
+        
+        centers = []
+        for detection in results.detections:
+            bbox = detection.location_data.relative_bounding_box
+            centers.append((bbox.xmin + bbox.width / 2, bbox.ymin + bbox.height / 2))
+        return face_score(centers), len(centers)
             
     except Exception as e:
         print(f"[SmartThumbnail] Face detection error: {e}")
@@ -206,7 +214,8 @@ def generate_smart_thumbnail(
     target_width: int = 1080,
     target_height: int = 1920,
     job_id: Optional[str] = None,
-    progress_callback: Optional[Callable[[int, str], None]] = None
+    progress_callback: Optional[Callable[[int, str], None]] = None,
+    save_candidates: Optional[bool] = None
 ) -> Dict:
     """
     Generate smart thumbnail by analyzing and scoring multiple frames.
@@ -218,6 +227,8 @@ def generate_smart_thumbnail(
         target_height: Target thumbnail height
         job_id: Optional job ID for logging
         progress_callback: Optional callback(progress_pct, stage) for reporting
+        save_candidates: Also write candidate frames to thumb-candidates/
+            (default SMART_THUMBNAIL_SAVE_CANDIDATES)
         
     Returns:
         Dict with:
@@ -227,13 +238,171 @@ def generate_smart_thumbnail(
             - metadata: Additional scoring metadata
     """
     os.makedirs(output_dir, exist_ok=True)
-    candidates_dir = os.path.join(output_dir, "thumb-candidates")
-    os.makedirs(candidates_dir, exist_ok=True)
+    candidates_dir = None
+    if SAVE_CANDIDATES if save_candidates is None else save_candidates:
+        candidates_dir = os.path.join(output_dir, "thumb-candidates")
+        os.makedirs(candidates_dir, exist_ok=True)
     
     log_prefix = f"[SmartThumbnail] Job {job_id}: " if job_id else "[SmartThumbnail] "
     
+    # One frame source serves every candidate timestamp
+    try:
+        source = open_frame_source(video_path)
+    except RuntimeError:
+        print(f"{log_prefix}Failed to open video")
+        return {"error": "invalid_video"}
+    
+    try:
+        return _generate_from_source(
+            source, output_dir, candidates_dir, target_width, target_height, log_prefix, progress_callback
+        )
+    finally:
+        source.close()
+
+
+def generate_thumbnail_from_candidates(
+    video_path: str,
+    candidates: List[Dict],
+    output_dir: str,
+    target_width: int = 1080,
+    target_height: int = 1920,
+    job_id: Optional[str] = None
+) -> Dict:
+    """
+    Pick the thumbnail from candidates that the smart-crop analysis already
+    scored in the rendered crop window (smart_crop.thumbnail_candidates), so
+    the clip is not sampled, scored or searched for faces again: only the
+    winner is read from video_path (the encoded clip the candidate
+    timestamps refer to) and saved as thumb.jpg.
+    
+    Each candidate is a dict with "timestamp" (seconds into video_path),
+    "scores" (as score_frame returns) and "crop_window".
+    
+    Returns the same dict as generate_smart_thumbnail.
+    """
+    log_prefix = f"[SmartThumbnail] Job {job_id}: " if job_id else "[SmartThumbnail] "
+    
+    try:
+        source = open_frame_source(video_path)
+    except RuntimeError:
+        print(f"{log_prefix}Failed to open video")
+        return {"error": "invalid_video"}
+    
+    try:
+        duration = source.info.duration
+        # Skip fade-ins like the frame sampling of generate_smart_thumbnail does
+        skip_seconds = min(2.0, duration * 0.1)
+        usable = [c for c in candidates if skip_seconds <= c["timestamp"] < duration - 0.5]
+        if not usable:
+            print(f"{log_prefix}No analysis candidates inside the clip")
+            return {"error": "no_candidates"}
+        
+        ranked = sorted(usable, key=lambda c: c["scores"]["total"], reverse=True)
+        best, best_frame = None, None
+        for candidate in ranked:
+            # The next best only when a frame cannot be read
+            best_frame = source.frame_at(candidate["timestamp"])
+            if best_frame is not None:
+                best = candidate
+                break
+        
+        if best is None:
+            print(f"{log_prefix}No candidate frame could be read")
+            return {"error": "no_candidates"}
+        
+        scores = best["scores"]
+        print(f"{log_prefix}Best of {len(usable)} analysis candidates @ {best['timestamp']:.1f}s: "
+              f"brightness={scores['brightness']:.1f}, "
+              f"sharpness={scores['sharpness']:.1f}, "
+              f"faces={scores['faces']:.1f} ({scores['num_faces']} detected), "
+              f"total={scores['total']:.1f}")
+        
+        if best_frame.shape[:2] != (target_height, target_width):
+            best_frame = cv2.resize(best_frame, (target_width, target_height))
+        best_frame_path = os.path.join(output_dir, "thumb.jpg")
+        cv2.imwrite(best_frame_path, best_frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        
+        return {
+            "best_frame": best_frame_path,
+            "candidates": usable,
+            "strategy": "analysis_candidates",
+            "metadata": {
+                "video_duration": duration,
+                "num_candidates": len(usable),
+                "best_score": scores["total"],
+                "best_timestamp": best["timestamp"],
+                "crop_window": best["crop_window"]
+            }
+        }
+    finally:
+        source.close()
+
+
+def _prefilter_frames(
+    source: FrameSource,
+    skip_seconds: float,
+    last_second: float,
+    count: int
+) -> Tuple[List[float], List[np.ndarray]]:
+    """
+    Up to `count` (timestamp, downscaled frame) candidates in
+    [skip_seconds, last_second], in time order, at most one per evenly
+    spaced interval: the keyframes, from a pass that decodes keyframes only,
+    when there are at least MIN_CANDIDATES (capped at count) of them;
+    otherwise the first I/P frame of every interval, from a pass that skips
+    B-frames. Evenly spaced seeks when ffmpeg is not usable.
+    """
+    interval = (last_second - skip_seconds) / max(1, count - 1) if count > 1 else last_second + 1
+    wanted = min(count, MIN_CANDIDATES)
+    sampled, smalls = [], []
+    try:
+        for skip_frame in ("nokey", "bidir"):
+            sampled, smalls = [], []
+            with FfmpegFrameSource(source.video_path, max_edge=PREFILTER_MAX_EDGE) as prefilter:
+                for timestamp, frame in prefilter.frames_every(interval * 0.95, skip_frame=skip_frame):
+                    if timestamp > last_second or len(sampled) >= count:
+                        break
+                    if timestamp >= skip_seconds:
+                        sampled.append(round(timestamp, 3))
+                        smalls.append(frame.copy())
+            if len(sampled) >= wanted:
+                return sampled, smalls
+    except (OSError, RuntimeError) as e:
+        print(f"[SmartThumbnail] Prefilter decode failed ({e}), seeking instead")
+    if len(sampled) >= wanted:
+        return sampled, smalls
+    
+    w, h = source.info.width, source.info.height
+    scale = min(1.0, PREFILTER_MAX_EDGE / max(w, h))
+    small_size = (max(2, int(w * scale)), max(2, int(h * scale)))
+    taken = set(sampled)
+    seeks = [t for t in np.linspace(skip_seconds, last_second, wanted).round(3).tolist() if t not in taken]
+    for timestamp in seeks[:wanted - len(sampled)]:
+        frame = source.frame_at(timestamp)
+        if frame is not None:
+            sampled.append(timestamp)
+            smalls.append(cv2.resize(frame, small_size, interpolation=cv2.INTER_AREA) if scale < 1.0 else frame.copy())
+    order = np.argsort(sampled, kind="stable").tolist()
+    return [sampled[i] for i in order], [smalls[i] for i in order]
+
+
+def _generate_from_source(
+    source: FrameSource,
+    output_dir: str,
+    candidates_dir: Optional[str],
+    target_width: int,
+    target_height: int,
+    log_prefix: str,
+    progress_callback: Optional[Callable[[int, str], None]]
+) -> Dict:
+    """
+    Body of generate_smart_thumbnail for an already opened frame source.
+    Timestamps are visited in increasing order, so the source only seeks
+    forward; frames are scored in memory, two-tier (see PREFILTER_CANDIDATES),
+    and only the winner is read again at full resolution.
+    """
     # Get video duration
-    duration = get_video_duration(video_path)
+    duration = source.info.duration
     if duration <= 0:
         print(f"{log_prefix}Failed to get video duration")
         return {"error": "invalid_video"}
@@ -242,77 +411,75 @@ def generate_smart_thumbnail(
     
     # Define sampling points (skip first 2 seconds to avoid fade-ins/black frames)
     skip_seconds = min(2.0, duration * 0.1)  # Skip first 2s or 10% of video
-    effective_duration = duration - skip_seconds
+    last_second = max(skip_seconds, duration - 0.5)
     
-    # Generate only 3 candidates (user requirement)
-    timestamps = [
-        skip_seconds + effective_duration * 0.15,  # ~15% mark (early)
-        skip_seconds + effective_duration * 0.5,   # 50% mark (middle)
-        skip_seconds + effective_duration * 0.85,  # 85% mark (late)
-    ]
+    # Evenly spaced candidates, at most one per half second
+    count = max(1, min(PREFILTER_CANDIDATES, int((last_second - skip_seconds) / 0.5) + 1))
     
-    # Ensure all timestamps are within bounds
-    timestamps = [min(t, duration - 0.5) for t in timestamps if t < duration]
+    # Tier 1: downscaled frames, brightness and sharpness for all of them at once
+    if progress_callback:
+        progress_callback(0, "thumbnail_extraction")
+    sampled, smalls = _prefilter_frames(source, skip_seconds, last_second, count)
+    if not sampled:
+        print(f"{log_prefix}No valid candidates extracted")
+        return {"error": "no_candidates"}
+    print(f"{log_prefix}Sampled {len(sampled)} candidate frames")
     
-    print(f"{log_prefix}Sampling {len(timestamps)} candidate frames")
+    stack = np.stack([cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) for small in smalls])
+    brightness = brightness_scores(stack)
+    # Rated at the rendered thumbnail's size, like score_frame on the full frame
+    sharpness = sharpness_scores(stack, scale=stack.shape[2] / target_width)
+    prefilter = brightness + sharpness
     
-    # Extract and score candidate frames
+    # Tier 2: faces only on the best few
+    face_scored = set(np.argsort(-prefilter, kind="stable")[:FACE_SCORED_CANDIDATES].tolist())
     candidates = []
-    for idx, timestamp in enumerate(timestamps):
-        if progress_callback:
-            progress = int((idx / len(timestamps)) * 50)  # First 50% for extraction
-            progress_callback(progress, "thumbnail_extraction")
-        
-        candidate_path = os.path.join(candidates_dir, f"candidate_{idx}.jpg")
-        
-        if extract_frame_at_time(video_path, timestamp, candidate_path):
-            # Load frame for scoring
-            frame = cv2.imread(candidate_path)
-            if frame is not None:
-                # Score the frame
-                scores = score_frame(frame)
-                
-                candidates.append({
-                    "index": idx,
-                    "timestamp": timestamp,
-                    "path": candidate_path,
-                    "scores": scores,
-                    "total_score": scores["total"]
-                })
-                
-                print(f"{log_prefix}  Frame {idx} @ {timestamp:.1f}s: "
-                      f"brightness={scores['brightness']:.1f}, "
-                      f"sharpness={scores['sharpness']:.1f}, "
-                      f"faces={scores['faces']:.1f} ({scores['num_faces']} detected), "
-                      f"total={scores['total']:.1f}")
+    for idx, timestamp in enumerate(sampled):
+        face, num_faces = calculate_face_score(smalls[idx]) if idx in face_scored else (0.0, 0)
+        scores = {
+            "brightness": round(float(brightness[idx]), 2),
+            "sharpness": round(float(sharpness[idx]), 2),
+            "faces": round(face, 2),
+            "num_faces": num_faces,
+            "total": round(float(prefilter[idx]) + face, 2)
+        }
+        candidate = {
+            "index": idx,
+            "timestamp": timestamp,
+            "scores": scores,
+            "total_score": scores["total"],
+            "face_scored": idx in face_scored
+        }
+        candidates.append(candidate)
         
-        if progress_callback:
-            progress = int(((idx + 1) / len(timestamps)) * 50)
-            progress_callback(progress, "thumbnail_scoring")
+        if idx in face_scored:
+            if candidates_dir:
+                candidate["path"] = os.path.join(candidates_dir, f"candidate_{idx}.jpg")
+                cv2.imwrite(candidate["path"], smalls[idx], [cv2.IMWRITE_JPEG_QUALITY, 90])
+            print(f"{log_prefix}  Frame {idx} @ {timestamp:.1f}s: "
+                  f"brightness={scores['brightness']:.1f}, "
+                  f"sharpness={scores['sharpness']:.1f}, "
+                  f"faces={scores['faces']:.1f} ({scores['num_faces']} detected), "
+                  f"total={scores['total']:.1f}")
     
-    if not candidates:
-        print(f"{log_prefix}No valid candidates extracted")
-        return {"error": "no_candidates"}
+    if progress_callback:
+        progress_callback(50, "thumbnail_scoring")
     
-    # Select best candidate
-    best_candidate = max(candidates, key=lambda c: c["total_score"])
-    print(f"{log_prefix}Best frame: #{best_candidate['index']} "
+    # Select best candidate (faces can only raise a score, so it is one of the face-scored)
+    best_candidate = max((c for c in candidates if c["face_scored"]), key=lambda c: c["total_score"])
+    print(f"{log_prefix}Best frame: #{best_candidate['index']} of {len(candidates)} "
           f"with score {best_candidate['total_score']:.1f}")
     
-    # Copy best frame to output location
+    # Encode the best frame, at full resolution, once, to the output location
+    best_frame = source.frame_at(best_candidate["timestamp"])
+    if best_frame is None:
+        best_frame = smalls[best_candidate["index"]]
     best_frame_path = os.path.join(output_dir, "thumb.jpg")
-    
-    # Read best frame and resize to target dimensions
-    frame = cv2.imread(best_candidate["path"])
-    if frame is not None and (frame.shape != (target_height, target_width)):
+    if best_frame.shape[:2] != (target_height, target_width):
         # Resize frame to target dimensions (should already be correct from video processing)
         # This is just a safety measure
-        frame = cv2.resize(frame, (target_width, target_height))
-        cv2.imwrite(best_frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
-    else:
-        # Just copy the file
-        import shutil
-        shutil.copy(best_candidate["path"], best_frame_path)
+        best_frame = cv2.resize(best_frame, (target_width, target_height))
+    cv2.imwrite(best_frame_path, best_frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
     
     if progress_callback:
         progress_callback(100, "thumbnail_complete")